@@ -0,0 +1,288 @@
+"""Benchmarks for the PBI Bookmarks Monthly Update script.
+
+The script generates the synthetic .pbix files (random DataModel, Layout with the English and Chinese
+period values in the slicers and bookmarks), times every stage of the processing and the end-to-end main() flow
+on the directory tree with many workspaces, and saves the timings as JSON, so the results can be compared between commits.
+Everything runs offline in the temporary directory.
+
+Example:
+    python benchmark.py --output bench.json --repeat 5
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+from zipfile import ZipFile
+
+import bookmarks_update
+
+
+"""SYNTHETIC .PBIX GENERATOR"""
+MONTHS_ENG = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+# The kinds of the period values in the Layout, the same as in the real reports (see get_patterns_and_replacements)
+PERIOD_VALUE_GENERATORS = [
+    lambda rnd: "'{}'".format(rnd.choice(MONTHS_ENG)),                                # month eng
+    lambda rnd: "'{}月'".format(rnd.randint(1, 12)),                                  # month chn
+    lambda rnd: "'Q {}'".format(rnd.randint(1, 4)),                                   # quarter eng (with space)
+    lambda rnd: "'Q{}'".format(rnd.randint(1, 4)),                                    # quarter eng (without space)
+    lambda rnd: "'{}季度'".format(rnd.randint(1, 4)),                                  # quarter chn
+    lambda rnd: "'{}, {}'".format(rnd.choice(MONTHS_ENG), rnd.randint(2020, 2024)),   # exchange rate
+    lambda rnd: "{}L".format(rnd.randint(2020, 2024)),                               # year
+]
+OTHER_VALUES = ["'Sales'", "'北京'", "'Total'", "'上海'", "'EMEA'", "100L", "'Actual'"]
+
+
+def to_json(data):
+    # Power BI saves the configs as the compact JSON strings
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def create_filter(rnd):
+    value = rnd.choice(PERIOD_VALUE_GENERATORS)(rnd) if rnd.random() < 0.6 else rnd.choice(OTHER_VALUES)
+    return {"Condition": {"In": {
+        "Expressions": [{"Column": {"Expression": {"SourceRef": {"Entity": "Calendar"}}, "Property": "Period"}}],
+        "Values": [[{"Literal": {"Value": value}}]]}}}
+
+
+def create_layout(visuals_count, bookmarks_count, seed=0):
+    """Creating the Layout data: the pages with the visuals (slicers) and the bookmarks.
+    The configs are nested JSON strings, so the period values look like {\\"Value\\":\\"'Jan'\\"} in the Layout"""
+    rnd = random.Random(seed)
+    pages_count = max(1, visuals_count // 20)
+    sections = []
+    for page_index in range(pages_count):
+        visual_containers = []
+        for visual_index in range(page_index, visuals_count, pages_count):
+            visual_config = {
+                "name": "visual{}".format(visual_index),
+                "layouts": [{"id": 0, "position": {"x": rnd.randint(0, 1200), "y": rnd.randint(0, 700), "width": 200, "height": 80}}],
+                "singleVisual": {"visualType": "slicer", "objects": {"general": [{"properties": {"filter": {"filter": {
+                    "Version": 2, "Where": [create_filter(rnd) for _ in range(rnd.randint(1, 3))]}}}}]}}
+            }
+            visual_containers.append({"x": 0, "y": 0, "z": visual_index, "config": to_json(visual_config), "filters": "[]"})
+        sections.append({"name": "ReportSection{}".format(page_index), "displayName": "Page {}".format(page_index + 1),
+                         "visualContainers": visual_containers})
+    bookmarks = [{"name": "Bookmark{}".format(bookmark_index), "displayName": "Bookmark {}".format(bookmark_index),
+                  "explorationState": {"sections": {"ReportSection0": {"visualContainers": {
+                      "visual{}".format(visual_index): {"filters": {"byExpr": [{"filter": {"Where": [create_filter(rnd)]}}]}}
+                      for visual_index in range(min(visuals_count, 5))}}}}}
+                 for bookmark_index in range(bookmarks_count)]
+    return to_json({"id": 0, "sections": sections, "config": to_json({"version": "5.43", "bookmarks": bookmarks})})
+
+
+def create_pbix(pbix_file_path, datamodel_size, visuals_count, bookmarks_count, seed=0):
+    # The members and the compression modes are the same as in the .pbix files saved by the PBI Desktop
+    rnd = random.Random(seed)
+    os.makedirs(os.path.dirname(pbix_file_path), exist_ok=True)
+    content_types = ('<?xml version="1.0" encoding="utf-8"?><Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                     '<Default Extension="json" ContentType="" /><Override PartName="/Version" ContentType="" />'
+                     '<Override PartName="/DataModel" ContentType="" /><Override PartName="/Report/Layout" ContentType="" />'
+                     + bookmarks_update.SECURITY_BINDINGS_CONTENT_TYPE_RECORD + '</Types>')
+    theme = to_json({"name": "CY23SU08", "dataColors": ["#{:06X}".format(rnd.randrange(1 << 24)) for _ in range(2000)]})
+    with ZipFile(pbix_file_path, mode="w") as pbix_archive:
+        pbix_archive.writestr("Version", "1.28".encode("utf-16-le"), zipfile.ZIP_DEFLATED)
+        pbix_archive.writestr(bookmarks_update.CONTENT_TYPES_MEMBER_NAME, content_types, zipfile.ZIP_DEFLATED)
+        pbix_archive.writestr("DataModel", rnd.randbytes(datamodel_size), zipfile.ZIP_STORED)
+        pbix_archive.writestr("DiagramLayout", to_json({"version": "1.1.0", "diagrams": []}).encode("utf-16-le"), zipfile.ZIP_DEFLATED)
+        pbix_archive.writestr(bookmarks_update.LAYOUT_MEMBER_NAME,
+                              create_layout(visuals_count, bookmarks_count, seed).encode("utf-16-le"), zipfile.ZIP_DEFLATED)
+        pbix_archive.writestr("Report/StaticResources/SharedResources/BaseThemes/CY23SU08.json", theme, zipfile.ZIP_DEFLATED)
+        pbix_archive.writestr("Settings", to_json({"Version": 4}).encode("utf-16-le"), zipfile.ZIP_DEFLATED)
+        pbix_archive.writestr("Metadata", to_json({"Version": 5}).encode("utf-16-le"), zipfile.ZIP_DEFLATED)
+        pbix_archive.writestr(bookmarks_update.SECURITY_BINDINGS_MEMBER_NAME, rnd.randbytes(512), zipfile.ZIP_DEFLATED)
+
+
+def create_work_dir(work_dir_path, workspaces_count, reports_count, datamodel_size, visuals_count, bookmarks_count):
+    # Creating the working directory with the workspace subdirectories and the .pbix files in them
+    for ws_index in range(workspaces_count):
+        for report_index in range(reports_count):
+            create_pbix(os.path.join(work_dir_path, "Workspace {}".format(ws_index), "Report {}.pbix".format(report_index)),
+                        datamodel_size, visuals_count, bookmarks_count, seed=ws_index * reports_count + report_index)
+
+
+"""BENCHMARKS"""
+def time_function(function, setup=None, repeat=3):
+    """Timing the function. The setup function is called before every run and isn't timed.
+    The output of the script is suppressed"""
+    timings = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            setup_result = setup() if setup else None
+            start_time = time.perf_counter()
+            function(setup_result)
+            timings.append(time.perf_counter() - start_time)
+    return timings
+
+
+def create_result(benchmark_name, parameters, timings):
+    return {
+        "benchmark": benchmark_name,
+        "parameters": parameters,
+        "seconds": timings,
+        "min": min(timings),
+        "median": statistics.median(timings)
+    }
+
+
+def benchmark_stages(root_path, report_sizes, repeat):
+    """Timing the stages of the single report processing for the reports of different sizes"""
+    results = []
+    compiled_patterns = bookmarks_update.compile_period_patterns(bookmarks_update.get_patterns_and_replacements(2024, 1, None))
+    work_dir_path = os.path.join(root_path, "stages")
+    with contextlib.redirect_stdout(io.StringIO()):
+        bookmarks_update.setup_work_dir_paths(work_dir_path)
+    for report_size in report_sizes:
+        source_pbix_file_path = os.path.join(work_dir_path, "source", "report.pbix")
+        create_pbix(source_pbix_file_path, **report_size)
+        pbix_file_path = os.path.join(work_dir_path, "ws", "report.pbix")
+        temp_files_path = os.path.join(work_dir_path, "#TEMP", "report")
+        result_pbix_file_path = os.path.join(work_dir_path, "#TEMP", "result.pbix")
+        parameters = dict(report_size, pbix_size=os.path.getsize(source_pbix_file_path))
+
+        def copy_source(_=None):
+            shutil.rmtree(os.path.join(work_dir_path, "#TEMP"), ignore_errors=True)
+            shutil.rmtree(bookmarks_update.ORIGINALS_DIR_PATH, ignore_errors=True)
+            for directory_path in (os.path.dirname(pbix_file_path), os.path.dirname(result_pbix_file_path)):
+                os.makedirs(directory_path, exist_ok=True)
+            shutil.copy(source_pbix_file_path, pbix_file_path)
+
+        def unzip_source():
+            copy_source()
+            bookmarks_update.unzip_pbix(pbix_file_path, temp_files_path)
+
+        def remove_security_bindings_from_source():
+            unzip_source()
+            bookmarks_update.remove_security_bindings_data(temp_files_path)
+
+        def modify_source_layout():
+            remove_security_bindings_from_source()
+            bookmarks_update.modify_layout_file(temp_files_path, compiled_patterns)
+
+        stages = [
+            ("backup_original_file", copy_source,
+             lambda _: bookmarks_update.backup_original_file(pbix_file_path, bookmarks_update.get_file_hash(pbix_file_path))),
+            ("unzip_pbix", copy_source,
+             lambda _: bookmarks_update.unzip_pbix(pbix_file_path, temp_files_path)),
+            ("remove_security_bindings_data", unzip_source,
+             lambda _: bookmarks_update.remove_security_bindings_data(temp_files_path)),
+            ("modify_layout_file", remove_security_bindings_from_source,
+             lambda _: bookmarks_update.modify_layout_file(temp_files_path, compiled_patterns)),
+            ("zip_pbix", modify_source_layout,
+             lambda _: bookmarks_update.zip_pbix(temp_files_path, pbix_file_path)),
+            ("rewrite_pbix", copy_source,
+             lambda _: bookmarks_update.rewrite_pbix(pbix_file_path, result_pbix_file_path, compiled_patterns)),
+            ("get_layout_changes_count", copy_source,
+             lambda _: bookmarks_update.get_layout_changes_count(pbix_file_path, compiled_patterns)),
+        ]
+        for stage_name, setup, stage_function in stages:
+            results.append(create_result(stage_name, parameters, time_function(stage_function, setup, repeat)))
+            print_result(results[-1])
+    shutil.rmtree(work_dir_path)
+    return results
+
+
+def benchmark_main(root_path, tree_size, cli_args_variants, repeat):
+    """Timing the end-to-end main() flow on the working directory with many workspaces.
+    Every run gets the fresh copy of the working directory, the second run measures the re-run of the same update"""
+    results = []
+    source_work_dir_path = os.path.join(root_path, "main_source")
+    work_dir_path = os.path.join(root_path, "main")
+    create_work_dir(source_work_dir_path, **tree_size)
+
+    def copy_work_dir():
+        shutil.rmtree(work_dir_path, ignore_errors=True)
+        shutil.copytree(source_work_dir_path, work_dir_path)
+
+    def run_main(cli_args):
+        saved_argv = sys.argv
+        sys.argv = ["bookmarks_update.py", "-d", work_dir_path, "-y", "2024", "-m", "1"] + cli_args
+        try:
+            bookmarks_update.main()
+        finally:
+            sys.argv = saved_argv
+
+    for cli_args in cli_args_variants:
+        parameters = dict(tree_size, cli_args=" ".join(cli_args))
+        results.append(create_result("main", parameters, time_function(lambda _: run_main(cli_args), copy_work_dir, repeat)))
+        print_result(results[-1])
+        results.append(create_result("main (re-run)", parameters, time_function(lambda _: run_main(cli_args), None, repeat)))
+        print_result(results[-1])
+    shutil.rmtree(work_dir_path)
+    shutil.rmtree(source_work_dir_path)
+    return results
+
+
+def get_git_commit():
+    # The commit of the benchmarked code, if the script is in the git repository
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception:
+        return None
+
+
+def print_result(result):
+    bookmarks_update.uprint("{:<32} min {:>8.3f}s  median {:>8.3f}s  {}".format(
+        result["benchmark"], result["min"], result["median"], result["parameters"]))
+
+
+"""MAIN FUNCTION"""
+def get_cli_parser():
+    parser = argparse.ArgumentParser(description="Benchmarks for the PBI Bookmarks Monthly Update script")
+    parser.add_argument("-o", "--output", type=str, help="The JSON file for the results. The results are printed, if not provided")
+    parser.add_argument("-n", "--repeat", type=int, default=3, help="Number of runs for every benchmark")
+    parser.add_argument("-w", "--workspaces", type=int, default=5, help="Number of workspaces for the main() benchmark")
+    parser.add_argument("-r", "--reports", type=int, default=4, help="Number of reports per workspace for the main() benchmark")
+    parser.add_argument("-j", "--jobs", type=int, default=4, help="Number of worker processes for the parallel main() benchmark")
+    parser.add_argument("-q", "--quick", action="store_true", help="Small reports and the directory tree for the quick check")
+    return parser
+
+
+def main():
+    cli_args = get_cli_parser().parse_args()
+    scale = 10 if cli_args.quick else 1
+    # DataModel size, Layout size (visuals and bookmarks) of the small, medium and large reports
+    report_sizes = [
+        {"datamodel_size": 1024 * 1024 // scale, "visuals_count": 50 // scale, "bookmarks_count": 10 // scale},
+        {"datamodel_size": 20 * 1024 * 1024 // scale, "visuals_count": 500 // scale, "bookmarks_count": 100 // scale},
+        {"datamodel_size": 100 * 1024 * 1024 // scale, "visuals_count": 3000 // scale, "bookmarks_count": 500 // scale},
+    ]
+    tree_size = {"workspaces_count": cli_args.workspaces, "reports_count": cli_args.reports,
+                 "datamodel_size": 5 * 1024 * 1024 // scale, "visuals_count": 300 // scale, "bookmarks_count": 50 // scale}
+    cli_args_variants = [[], ["-s"], ["-s", "-j", str(cli_args.jobs)]]
+
+    with tempfile.TemporaryDirectory(prefix="pbix_benchmark_") as root_path:
+        results = benchmark_stages(root_path, report_sizes, cli_args.repeat)
+        results += benchmark_main(root_path, tree_size, cli_args_variants, cli_args.repeat)
+
+    benchmark_report = {
+        "commit": get_git_commit(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results
+    }
+    if cli_args.output:
+        with open(cli_args.output, "w", encoding="utf-8") as output_file:
+            json.dump(benchmark_report, output_file, indent=2, ensure_ascii=False)
+        print("Saved the results to {}".format(cli_args.output))
+    else:
+        print(json.dumps(benchmark_report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,29 @@ import os
 import sys
 import shutil
 import re
+import struct
 import calendar
 import datetime
 import zipfile
+import io
+import contextlib
+import codecs
+import hashlib
+import json
+import zlib
+import csv
+import time
+import threading
+import collections
+import select
+import signal
+import ctypes
+import ctypes.util
+import cProfile
+import fnmatch
 
 from zipfile import ZipFile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 
 """GLOBAL VARIABLES"""
@@ -17,7 +35,32 @@ WORK_DIR_PATH:str = None        # Working directory with all the data
 ORIGINALS_DIR_PATH:str = None   # Directory for original files
 TEMP_DIR_PATH:str = None        # Directory for temporary (unarchived) files
 ERRORS_DIR_PATH:str = None 
-RESULTS_DIR_PATH:str = None     # Directory for the modified .pbix files
+RESULTS_DIR_PATH:str = None     # Directory for the modified .pbix files of the batch mode (one subdirectory per period)
+MANIFEST_FILE_PATH:str = None   # File with the content hashes and the target periods of the processed reports
+INDEX_DIR_PATH:str = None       # Directory for the offsets of the period values in the Layout files
+DISCOVERY_CACHE_FILE_PATH:str = None  # File with the .pbix files and subdirectories of every scanned directory
+JOURNAL_FILE_PATH:str = None    # File with the reports completed by the current (or interrupted) run
+BACKUP_GENERATION_ID:str = None  # The backup generation of the current run, the backed up files are recorded to it right away
+
+"""Archive members constants"""
+# The .pbix archive members, which are modified by the script. All other members are left untouched
+LAYOUT_MEMBER_NAME = "Report/Layout"
+CONTENT_TYPES_MEMBER_NAME = "[Content_Types].xml"
+SECURITY_BINDINGS_MEMBER_NAME = "SecurityBindings"
+SECURITY_BINDINGS_CONTENT_TYPE_RECORD = '<Override PartName="/SecurityBindings" ContentType="" />'
+BACKUP_OBJECTS_DIR_NAME = "objects"  # The #ORIGINALS BACKUP subdirectory with the original files named by their content hashes
+BACKUP_GENERATIONS_DIR_NAME = "generations"  # The #ORIGINALS BACKUP subdirectory with the list of the backed up files per run
+DEFAULT_KEEP_BACKUPS = 12  # The number of the backup generations (runs), which are kept in the #ORIGINALS BACKUP
+DISCOVERY_CACHE_MIN_AGE = 2  # The directories modified in the last seconds are not cached (the modification time may be not precise)
+COMPRESS_QUEUE_SIZE = 2  # The number of the members compressed ahead of the archive writer per compression thread
+RAW_COPY_CHUNK_SIZE = 1024 * 1024  # The size of the chunks, in which the compressed members are copied between archives
+LAYOUT_CHUNK_SIZE = 1024 * 1024  # The size of the chunks (in bytes), in which the Layout file is read and rewritten
+LAYOUT_OVERLAP_SIZE = 256  # The number of characters kept between the Layout chunks - longer than any period Value expression
+DEFAULT_WATCH_DEBOUNCE = 5  # Seconds, for which the size and the modification time of the new file must not change before it's processed
+WATCH_POLL_INTERVAL = 2  # Seconds between the directory scans of the watch mode, if inotify is not available
+INOTIFY_EVENTS_MASK = 0x2 | 0x8 | 0x80 | 0x100  # IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+INOTIFY_IS_DIR, INOTIFY_QUEUE_OVERFLOW = 0x40000000, 0x4000  # IN_ISDIR, IN_Q_OVERFLOW
+JOURNAL_LOCK = threading.Lock()  # The journal lines of the parallel workers' results are appended from the executor threads
 
 
 """FUNCTIONS"""
@@ -38,10 +81,19 @@ def get_cli_parser():
         \r- Directory argument (-d --directory):
         \r  * Enter the argument to specify the custom location of the root working directory.
         \r  * Ignore the argument, if the script is called from the working directory.
+        \r- Include and Exclude arguments (-i --include & -x --exclude)
+        \r  * The glob patterns of the <workspace>/<report>.pbix paths, which should be processed or skipped, when the working directory is scanned.
+        \r    Both arguments may be repeated. Example: -i "Finance*/*" -x "*/Draft *.pbix"
         \r- Year and Month arguments (-y --year & -m --month)
         \r  * Enter the arguments to specify the custom new values of Year and Month.
         \r    The Year and Month arguments should be passed together.
         \r  * Ignore the arguments, to update the report according to current date.
+        \r- Periods argument (-P --periods)
+        \r  * Enter the list of the target periods to save the updated copies of every report for several months at once (batch mode).
+        \r    The periods are separated by commas, the ranges are set with a colon. Example: -P 2023-11,2024-01:2024-06
+        \r  * Every source archive is read only once. The source files are not changed:
+        \r    the result files are saved to the #RESULTS/<YYYY-MM>/<workspace> folders. The archives are always rewritten zip-to-zip.
+        \r    The argument can't be combined with the Year and Month arguments.
         \r- Old Year Value (-o --oldYearValue)
         \r  * Enter the value of the year, which should be replaced in slicers
         \r  * By default, the year value from previous month is used as the old value (for Feb 2023 - Jan 2023 - same years)
@@ -49,15 +101,72 @@ def get_cli_parser():
         \r  * The specific workspace subfolder and .pbix file, which should be processed.
         \r    The Workspace and Report arguments should be passed together.
         \r    The Report argument may recieve both filenames with or without extension.
+        \r- Stream argument (-s --stream)
+        \r  * Enter the argument to rewrite the .pbix archives directly (zip-to-zip) without the extraction to the #TEMP folder.
+        \r    Only the Layout and [Content_Types].xml files are modified in memory, the other files are copied as is.
+        \r- Force argument (-f --force)
+        \r  * Enter the argument to process all the reports, even if they are already updated to the new period
+        \r    or there are no period values to change in them.
+        \r  * Ignore the argument, to skip such reports. The state of the processed reports is saved to the #MANIFEST.json file.
+        \r- Jobs argument (-j --jobs)
+        \r  * Enter the number of worker processes to process the reports in parallel.
+        \r    The log output is collected per report and printed in the order of the reports.
+        \r  * Ignore the argument, to process the reports one at a time.
+        \r  * The members of every result archive are compressed in parallel threads. The CPU cores are shared between the worker processes.
+        \r- Keep Backups argument (-k --keepBackups)
+        \r  * The original files are saved to the #ORIGINALS BACKUP folder by their content hashes, so the unchanged files are saved only once.
+        \r    Every run is the backup generation. Enter the number of the generations to keep (12 by default).
+        \r- Restore argument (--restore)
+        \r  * Enter the backup generation (the run start time, for example "2024-02-15 10-30-00") or "latest"
+        \r    to restore the original files to the workspace directories instead of the update.
+        \r    The "latest" value restores the newest backup of every file. Use -w and -r arguments to restore the specific report.
+        \r- Resume argument (--resume)
+        \r  * Every completed report is recorded to the #JOURNAL.jsonl file during the run. The journal is removed at the end of the run.
+        \r    Enter the argument to continue the interrupted run: the reports completed by the interrupted run are not processed again.
+        \r    The journal is used only for the same target period (periods), otherwise all the reports are processed.
+        \r- Watch argument (--watch)
+        \r  * Enter the argument to keep the script running and process the new and changed .pbix files in the workspace folders
+        \r    as soon as they are completely written (their size and modification time don't change for the debounce time).
+        \r    The folders are monitored with inotify on Linux, otherwise they are scanned every few seconds. Press Ctrl+C to stop.
+        \r  * Debounce argument (--debounce): the seconds to wait for the file to be completely written (5 by default).
+        \r  * Idle Exit argument (--idleExit): the seconds without new files, after which the watching is stopped (never by default).
+        \r- Every result archive is verified before it replaces the source file: its central directory, local headers and CRCs,
+        \r  the Layout JSON and the SecurityBindings removal. The file, which fails the check, is moved to the #ERRORS folder.
+        \r- Run Report argument (-R --runReport)
+        \r  * Enter the path of the JSON lines file to save the wall time, bytes read and written, archive sizes and matches counts
+        \r    of every processing stage (backup, unzip, SecurityBindings removal, Layout modification, zip) of every report.
+        \r    The lines of every new run are appended to the file.
+        \r- Profile argument (-p --profile)
+        \r  * Enter the directory path to run the processing of every report under cProfile and save the stats to .prof files.
+        \r- Scan argument (--scan)
+        \r  * Enter the path of the summary file to only count the period values in the reports, without any changes.
+        \r    Only the Layout files are read from the archives. Nothing is written to the working directory.
+        \r    The summary is saved as CSV for the .csv file extension, otherwise as JSON. Enter "-" to print the summary.
         ''',
         formatter_class=argparse.RawDescriptionHelpFormatter
     )
     parser.add_argument("-d", "--directory", type=str, help="The work directory - directory with .pbix files, where all updates will occur", required=False)
     parser.add_argument("-w", "--workspace", type=str, help="PBI Workspace subdirectory", required=False)
     parser.add_argument("-r", "--report", type=str, help="The report filename with or without the .pbix extension", required=False)
+    parser.add_argument("-i", "--include", type=str, action="append", help="Glob pattern of the <workspace>/<report>.pbix paths to process (repeatable)", required=False)
+    parser.add_argument("-x", "--exclude", type=str, action="append", help="Glob pattern of the <workspace>/<report>.pbix paths to skip (repeatable)", required=False)
     parser.add_argument("-y", "--year", type=int, help="New value for Year", required=False)
     parser.add_argument("-m", "--month", type=int, help="New value for Month", required=False)
+    parser.add_argument("-P", "--periods", type=str, help="Target periods of the batch mode: YYYY-MM list or YYYY-MM:YYYY-MM ranges", required=False)
     parser.add_argument("-o", "--oldYearValue", type=int, help="Old value for Year", required=False)
+    parser.add_argument("-s", "--stream", action="store_true", help="Rewrite the .pbix files zip-to-zip without the #TEMP extraction")
+    parser.add_argument("-f", "--force", action="store_true", help="Process the reports, which need no changes")
+    parser.add_argument("--quickVerify", action="store_true", help="Don't check the data of the copied members of the result archives")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of worker processes for the reports processing", required=False)
+    parser.add_argument("-R", "--runReport", type=str, help="JSON lines file for the stage timings and I/O of the run", required=False)
+    parser.add_argument("-p", "--profile", type=str, help="Directory for the cProfile stats of every report", required=False)
+    parser.add_argument("-k", "--keepBackups", type=int, default=DEFAULT_KEEP_BACKUPS, help="Number of the backup generations to keep", required=False)
+    parser.add_argument("--restore", type=str, help="Restore the original files from the backup generation (or latest)", required=False)
+    parser.add_argument("--resume", action="store_true", help="Continue the interrupted run, skipping the reports from the #JOURNAL.jsonl")
+    parser.add_argument("--watch", action="store_true", help="Keep running and process the new and changed .pbix files")
+    parser.add_argument("--debounce", type=float, default=DEFAULT_WATCH_DEBOUNCE, help="Seconds for the file to be unchanged before the processing (watch mode)")
+    parser.add_argument("--idleExit", type=float, help="Seconds without new files, after which the watch mode is stopped", required=False)
+    parser.add_argument("--scan", type=str, help="Count the period values without changes and save the JSON/CSV summary to the file", required=False)
     return parser
 
 
@@ -107,6 +216,38 @@ def verify_cli_args(cli_parser: argparse.ArgumentParser):
         raise cli_parser.error("""Arguments Combination Error: -y --year is required when -m --month is set.
             \rOnly the value for the Year argument was provided (-m --month).
             \rPlease, provide BOTH YEAR and MONTH arguments to update the report with your custom date values.\n""")
+
+    # batch mode periods
+    if cli_args.periods:
+        if cli_args.year or cli_args.month:
+            cli_error_message()
+            raise cli_parser.error("""Arguments Combination Error: -P --periods can't be used together with -y --year and -m --month.
+                \rPlease, provide either the list of the periods or the single Year and Month values.\n""")
+        if cli_args.scan:
+            cli_error_message()
+            raise cli_parser.error("""Arguments Combination Error: -P --periods can't be used together with --scan.\n""")
+        try:
+            get_batch_periods(cli_args.periods)
+        except ValueError as periods_exception:
+            cli_error_message()
+            raise cli_parser.error("""Periods Value Error: {}
+                \rThe periods should be in the YYYY-MM format, separated by commas. The ranges are set with a colon: 2024-01:2024-06.\n"""
+                .format(periods_exception))
+
+    # number of backup generations
+    if cli_args.keepBackups < 1:
+        cli_error_message()
+        raise cli_parser.error("""Keep Backups Value Error: At least 1 backup generation should be kept.\n""")
+
+    # watch mode
+    if cli_args.watch and (cli_args.scan or cli_args.restore or cli_args.resume):
+        cli_error_message()
+        raise cli_parser.error("""Arguments Combination Error: --watch can't be used together with --scan, --restore and --resume.\n""")
+
+    # number of worker processes
+    if cli_args.jobs < 1:
+        cli_error_message()
+        raise cli_parser.error("""Jobs Value Error: The number of worker processes should be 1 or more.\n""")
     print("OK! No issues with CLI arguments\n--------------------------------")
 
 
@@ -114,7 +255,8 @@ def verify_cli_args(cli_parser: argparse.ArgumentParser):
 # WORKING DIRECTORY - PATHS, DIRECTORIES AND FILES
 def setup_work_dir_paths(cli_work_dir_path:str):
     """Assigning the paths to the global variables"""
-    global WORK_DIR_PATH, TEMP_DIR_PATH, RESULTS_DIR_PATH, ORIGINALS_DIR_PATH, ERRORS_DIR_PATH
+    global WORK_DIR_PATH, TEMP_DIR_PATH, RESULTS_DIR_PATH, ORIGINALS_DIR_PATH, ERRORS_DIR_PATH, MANIFEST_FILE_PATH, INDEX_DIR_PATH
+    global DISCOVERY_CACHE_FILE_PATH, JOURNAL_FILE_PATH
     # If the CLI argument was not provided, we take the Current Working Directory as the root
     WORK_DIR_PATH = cli_work_dir_path if cli_work_dir_path else os.getcwd()
     # IMPORTANT: the # symbol is used by get_pbix_workspaces_and_filenames() function to exclude the tech folders from file scan
@@ -124,24 +266,92 @@ def setup_work_dir_paths(cli_work_dir_path:str):
                                       #)  # The originals are moved from root folder to this folder
     ERRORS_DIR_PATH = os.path.join(WORK_DIR_PATH, "#ERRORS")
     #RESULTS_DIR_PATH = WORK_DIR_PATH  # The files with updates are saved to the root folder
+    RESULTS_DIR_PATH = os.path.join(WORK_DIR_PATH, "#RESULTS")  # Only the batch mode results, the source files are replaced otherwise
+    MANIFEST_FILE_PATH = os.path.join(WORK_DIR_PATH, "#MANIFEST.json")
+    INDEX_DIR_PATH = os.path.join(WORK_DIR_PATH, "#INDEX")
+    DISCOVERY_CACHE_FILE_PATH = os.path.join(WORK_DIR_PATH, "#DISCOVERY.json")
+    JOURNAL_FILE_PATH = os.path.join(WORK_DIR_PATH, "#JOURNAL.jsonl")
     print("\nWORKING DIRECTORY PATHS:", WORK_DIR_PATH, TEMP_DIR_PATH, ORIGINALS_DIR_PATH, ERRORS_DIR_PATH, sep="\n")
 
 
-def get_pbix_workspaces_and_filenames() -> list[tuple[str, str]]:
-    # Scanning the Working Directory for .pbix files
-    # We take the subfolder structures as Workspace names and .pbix filenames and save these pair into the list 
-    # Is used when only the directory is passed to the script
+def get_pbix_workspaces_and_filenames(include_patterns=None, exclude_patterns=None, save_cache=True) -> list[tuple[str, str]]:
+    """Scanning the Working Directory for .pbix files
+    We take the subfolder structures as Workspace names and .pbix filenames and save these pair into the list 
+    Is used when only the directory is passed to the script
+    The tech directories (#TEMP, #ORIGINALS BACKUP, #ERRORS...) are not scanned at all.
+    The directories, which were not changed since the previous run (the same modification time), are not listed again -
+    the .pbix files and subdirectories are taken from the discovery cache.
+    The include and exclude glob patterns are matched with the <workspace>/<report>.pbix paths"""
+    discovery_cache = load_discovery_cache()
+    updated_discovery_cache = {}
     pbix_paths_and_files = []
-    for directory_path, _, filenames in os.walk(WORK_DIR_PATH):
+    for directory_path, filenames in scan_directories("", discovery_cache, updated_discovery_cache):
+        workspace_name = shorten_dir_path(directory_path)
         for filename in filenames:
-            if (filename[-5:] == ".pbix"
-                    # excluding the child directories of the Working Directory, which are not the workspace directories 
-                    and os.path.join(WORK_DIR_PATH, "#") not in directory_path):
-                workspace_name = shorten_dir_path(directory_path)
+            if is_report_selected(workspace_name, filename, include_patterns, exclude_patterns):
                 pbix_paths_and_files.append((workspace_name, filename))
+    if save_cache:
+        save_discovery_cache(updated_discovery_cache)
     return pbix_paths_and_files
 
 
+def is_report_selected(ws_subdir, pbix_filename, include_patterns=None, exclude_patterns=None):
+    # Matching the <workspace>/<report>.pbix path with the include and exclude glob patterns (-i --include & -x --exclude)
+    report_path = "{}/{}".format(ws_subdir.replace(os.sep, "/"), pbix_filename)
+    if include_patterns and not any(fnmatch.fnmatch(report_path, pattern) for pattern in include_patterns):
+        return False
+    if exclude_patterns and any(fnmatch.fnmatch(report_path, pattern) for pattern in exclude_patterns):
+        return False
+    return True
+
+
+def scan_directories(relative_directory_path, discovery_cache, updated_discovery_cache):
+    # Yielding the directory path and the .pbix filenames for the directory and all its subdirectories (top-down, sorted by name)
+    directory_path = os.path.join(WORK_DIR_PATH, relative_directory_path) if relative_directory_path else WORK_DIR_PATH
+    mtime_ns = os.stat(directory_path).st_mtime_ns
+    cached_directory = discovery_cache.get(relative_directory_path)
+    if cached_directory and cached_directory["mtime_ns"] == mtime_ns:
+        filenames, subdirectories = cached_directory["files"], cached_directory["subdirectories"]
+    else:
+        filenames, subdirectories = [], []
+        with os.scandir(directory_path) as directory_entries:
+            for directory_entry in directory_entries:
+                if directory_entry.is_dir(follow_symlinks=False):
+                    # IMPORTANT: the # symbol marks the tech directories of the Working Directory, they are pruned before the scan
+                    if not relative_directory_path and directory_entry.name.startswith("#"):
+                        continue
+                    subdirectories.append(directory_entry.name)
+                elif directory_entry.name[-5:] == ".pbix":
+                    filenames.append(directory_entry.name)
+        filenames.sort()
+        subdirectories.sort()
+    if time.time_ns() - mtime_ns > DISCOVERY_CACHE_MIN_AGE * 10**9:
+        updated_discovery_cache[relative_directory_path] = {"mtime_ns": mtime_ns, "files": filenames, "subdirectories": subdirectories}
+
+    yield directory_path, filenames
+    for subdirectory in subdirectories:
+        yield from scan_directories(os.path.join(relative_directory_path, subdirectory), discovery_cache, updated_discovery_cache)
+
+
+def load_discovery_cache():
+    # Structure: {"<directory path relative to the Working Directory>": {"mtime_ns", "files", "subdirectories"}}
+    if not os.path.exists(DISCOVERY_CACHE_FILE_PATH):
+        return {}
+    try:
+        with open(DISCOVERY_CACHE_FILE_PATH, "r", encoding="utf-8") as discovery_cache_file:
+            return json.load(discovery_cache_file)
+    except ValueError:
+        # the damaged cache is ignored, all directories are scanned again
+        return {}
+
+
+def save_discovery_cache(discovery_cache):
+    discovery_cache_temp_file_path = DISCOVERY_CACHE_FILE_PATH + ".tmp"
+    with open(discovery_cache_temp_file_path, "w", encoding="utf-8") as discovery_cache_file:
+        json.dump(discovery_cache, discovery_cache_file, ensure_ascii=False)
+    os.replace(discovery_cache_temp_file_path, DISCOVERY_CACHE_FILE_PATH)
+
+
 def create_directories_hierarchy(pbi_workspaces):
     print("\nCREATING THE DIRECTORIES HIERARCHY")
     print("Working Directory: {}".format(WORK_DIR_PATH))
@@ -152,6 +362,9 @@ def create_directories_hierarchy(pbi_workspaces):
             print("{} [Created Directory]".format(os.path.basename(tech_dir)))
         else:
             print("{} [Directory Exists]".format(os.path.basename(tech_dir)))
+        if tech_dir == ORIGINALS_DIR_PATH:
+            # The backup store is not split by the workspaces (see backup_original_file)
+            continue
         for pbi_ws_name in pbi_workspaces:
             pbi_ws_subdirectory_path = os.path.join(tech_dir, pbi_ws_name)
             if not os.path.exists(pbi_ws_subdirectory_path):
@@ -172,18 +385,74 @@ def shorten_dir_path(path):
     
 
 # FILES AND DIRECTORIES MANIPULATIONS - MOVING, DELETING
-def backup_original_file(src_pbix_file_path, backup_pbix_file_path):
-    # Copying the original files from WORK_DIR to ORIGINALS_BACKUP_DIR
-    shutil.copy(src_pbix_file_path, backup_pbix_file_path)
-    print("Moved the original {} file to #ORIGINALS BACKUP folder".format(os.path.basename(src_pbix_file_path)))
+def link_or_copy_file(src_file_path, dst_file_path, link=True):
+    # Hardlinking the file, if the file system supports it, otherwise copying. Returns True, if the file is hardlinked.
+    # The file is created under the temp name and renamed, so the parallel workers never see the incomplete file
+    temp_file_path = "{}.{}.tmp".format(dst_file_path, os.getpid())
+    linked = False
+    if link:
+        try:
+            os.link(src_file_path, temp_file_path)
+            linked = True
+        except OSError:
+            pass
+    if not linked:
+        shutil.copy2(src_file_path, temp_file_path)
+    os.replace(temp_file_path, dst_file_path)
+    return linked
+
+
+def save_error_file(pbix_file_path, backup_pbix_file_path, error_pbix_file_path):
+    # Copying the original file to the #ERRORS folder: from the backup store, if the file is already backed up, otherwise from the source.
+    # The file, which can't be copied (it's locked or removed), is only reported, so the processing of the other files goes on
+    try:
+        if backup_pbix_file_path is not None:
+            copy_error_file(backup_pbix_file_path, error_pbix_file_path)
+            unlink_backup_file(pbix_file_path, backup_pbix_file_path)
+        else:
+            copy_error_file(pbix_file_path, error_pbix_file_path)
+    except OSError as e:
+        print("Failed to copy the {} file to #ERRORS folder: {}".format(os.path.basename(pbix_file_path), e))
+
+
+def unlink_backup_file(pbix_file_path, backup_pbix_file_path):
+    # The source file, which stays in the workspace folder after the error, is replaced with its real copy,
+    # if it is hardlinked to the backup file, so the in-place changes of the source never change the backup
+    if os.path.exists(pbix_file_path) and os.path.samefile(pbix_file_path, backup_pbix_file_path):
+        link_or_copy_file(backup_pbix_file_path, pbix_file_path, link=False)
+
+
+def backup_original_file(src_pbix_file_path, content_hash):
+    """Saving the original file to the #ORIGINALS BACKUP store, where the files are named by their content hashes.
+    The file, which is already in the store (for example, the report wasn't changed since the last backup), isn't copied again.
+    The result files replace the source files by the rename (see process_pbix_file), so the hardlinked backup is never changed.
+    Returns the path of the backup file and the number of the bytes copied (0, if the file is already in the store or hardlinked)"""
+    backup_pbix_file_path = get_backup_object_path(content_hash)
+    copied_bytes = 0
+    if os.path.exists(backup_pbix_file_path):
+        print("The original {} file is already in the #ORIGINALS BACKUP folder".format(os.path.basename(src_pbix_file_path)))
+    else:
+        os.makedirs(os.path.dirname(backup_pbix_file_path), exist_ok=True)
+        if not link_or_copy_file(src_pbix_file_path, backup_pbix_file_path):
+            copied_bytes = os.path.getsize(backup_pbix_file_path)
+        print("Saved the original {} file to #ORIGINALS BACKUP folder".format(os.path.basename(src_pbix_file_path)))
+    return backup_pbix_file_path, copied_bytes
+
+
+def replace_file(temp_file_path, file_path):
+    # Flushing the complete temp file to the disk and renaming it to the destination path.
+    # The rename is atomic, so the destination is either the previous file or the complete new file, even if the run is killed
+    with open(temp_file_path, "rb+") as temp_file:
+        os.fsync(temp_file.fileno())
+    os.replace(temp_file_path, file_path)
 
 
 def copy_error_file(src_pbix_file_path, error_pbix_file_path):
-    # Copying the original files from WORK_DIR to ORIGINALS_BACKUP_DIR
+    # Copying the original files from ORIGINALS_BACKUP_DIR to the ERRORS_DIR/<workspace>/<report>.pbix/ directory
     if not os.path.exists(error_pbix_file_path):
         os.mkdir(error_pbix_file_path)
-    shutil.copy(src_pbix_file_path, error_pbix_file_path)
-    print("Moved the {} file to #ERRORS folder".format(os.path.basename(src_pbix_file_path)))
+    shutil.copy(src_pbix_file_path, os.path.join(error_pbix_file_path, os.path.basename(error_pbix_file_path)))
+    print("Moved the {} file to #ERRORS folder".format(os.path.basename(error_pbix_file_path)))
 
 
 def remove_temp_files():
@@ -191,6 +460,204 @@ def remove_temp_files():
     print("Removed the #TEMP directory")
 
 
+# BACKUP STORE - GENERATIONS, RETENTION, RESTORE
+def get_backup_object_path(content_hash):
+    return os.path.join(ORIGINALS_DIR_PATH, BACKUP_OBJECTS_DIR_NAME, content_hash[:2], content_hash + ".pbix")
+
+
+def setup_backup_generation(generation_id):
+    global BACKUP_GENERATION_ID
+    BACKUP_GENERATION_ID = generation_id
+
+
+def get_backup_generations():
+    # The generation files are named by the run start time, so the sorted names are the generations from the oldest to the newest.
+    # The generation of the interrupted run may have only the pending records (see record_backup_file)
+    generations_dir_path = os.path.join(ORIGINALS_DIR_PATH, BACKUP_GENERATIONS_DIR_NAME)
+    if not os.path.exists(generations_dir_path):
+        return []
+    return sorted(set(filename.split(".")[0] for filename in os.listdir(generations_dir_path)
+                      if filename.endswith(".json") or filename.endswith(".pending.jsonl")))
+
+
+def get_pending_backup_records_paths(generation_id):
+    generations_dir_path = os.path.join(ORIGINALS_DIR_PATH, BACKUP_GENERATIONS_DIR_NAME)
+    if not os.path.exists(generations_dir_path):
+        return []
+    return [os.path.join(generations_dir_path, filename) for filename in os.listdir(generations_dir_path)
+            if filename.startswith(generation_id + ".") and filename.endswith(".pending.jsonl")]
+
+
+def record_backup_file(ws_subdir, pbix_filename, content_hash):
+    """Recording the backed up file to the generation of the current run, before the source file is replaced.
+    The record is flushed to the disk right away, so the backup file of the interrupted run is never pruned as unreferenced.
+    Every process appends to its own pending records file, so the parallel workers never write to the same file.
+    The pending records are merged to the generation file at the end of the run (see save_backup_generation)"""
+    if BACKUP_GENERATION_ID is None:
+        return
+    generations_dir_path = os.path.join(ORIGINALS_DIR_PATH, BACKUP_GENERATIONS_DIR_NAME)
+    os.makedirs(generations_dir_path, exist_ok=True)
+    pending_records_path = os.path.join(generations_dir_path, "{}.{}.pending.jsonl".format(BACKUP_GENERATION_ID, os.getpid()))
+    with open(pending_records_path, "a", encoding="utf-8") as pending_records_file:
+        pending_records_file.write(json.dumps({get_manifest_key(ws_subdir, pbix_filename): content_hash}, ensure_ascii=False) + "\n")
+        pending_records_file.flush()
+        os.fsync(pending_records_file.fileno())
+
+
+def load_backup_generation(generation_id):
+    # Structure: {"<workspace>/<report>": "<content hash>"}, together with the pending records of the generation
+    generation = {}
+    generation_file_path = os.path.join(ORIGINALS_DIR_PATH, BACKUP_GENERATIONS_DIR_NAME, generation_id + ".json")
+    if os.path.exists(generation_file_path):
+        with open(generation_file_path, "r", encoding="utf-8") as generation_file:
+            generation = json.load(generation_file)
+    for pending_records_path in get_pending_backup_records_paths(generation_id):
+        with open(pending_records_path, "r", encoding="utf-8") as pending_records_file:
+            for line in pending_records_file:
+                try:
+                    generation.update(json.loads(line))
+                except ValueError:
+                    break  # the last line of the killed run may be incomplete
+    return generation
+
+
+def remove_pending_backup_records(generation_id):
+    # Is called, when all the files of the run are saved to the generation file
+    for pending_records_path in get_pending_backup_records_paths(generation_id):
+        os.remove(pending_records_path)
+
+
+def save_backup_generation(generation_id, processing_results):
+    # Saving the list of the files, which were backed up during the run
+    generation = {get_manifest_key(result["workspace"], result["report"]): result["backup_hash"]
+                  for result in processing_results if "backup_hash" in result}
+    if generation_id in get_backup_generations():
+        # the runs started in the same second are saved as one generation, the pending records are included as well
+        generation = dict(load_backup_generation(generation_id), **generation)
+    if not generation:
+        return
+    generations_dir_path = os.path.join(ORIGINALS_DIR_PATH, BACKUP_GENERATIONS_DIR_NAME)
+    os.makedirs(generations_dir_path, exist_ok=True)
+    with open(os.path.join(generations_dir_path, generation_id + ".json"), "w", encoding="utf-8") as generation_file:
+        json.dump(generation, generation_file, indent=2, ensure_ascii=False)
+    print("Saved the backup generation {} ({} files)".format(generation_id, len(generation)))
+
+
+def prune_backup_generations(keep_backups):
+    # Removing the oldest generations over the retention limit and the backup files, which are not in the kept generations
+    generation_ids = get_backup_generations()
+    removed_generation_ids = generation_ids[:max(len(generation_ids) - keep_backups, 0)]
+    for generation_id in removed_generation_ids:
+        generation_file_path = os.path.join(ORIGINALS_DIR_PATH, BACKUP_GENERATIONS_DIR_NAME, generation_id + ".json")
+        if os.path.exists(generation_file_path):
+            os.remove(generation_file_path)
+        remove_pending_backup_records(generation_id)
+    kept_hashes = set()
+    for generation_id in generation_ids[len(removed_generation_ids):]:
+        kept_hashes.update(load_backup_generation(generation_id).values())
+
+    removed_files_count = 0
+    objects_dir_path = os.path.join(ORIGINALS_DIR_PATH, BACKUP_OBJECTS_DIR_NAME)
+    for directory_path, _, filenames in os.walk(objects_dir_path):
+        for filename in filenames:
+            if filename.endswith(".pbix") and filename[:-5] not in kept_hashes:
+                os.remove(os.path.join(directory_path, filename))
+                removed_files_count += 1
+    if removed_generation_ids or removed_files_count:
+        print("Removed {} old backup generations and {} backup files".format(len(removed_generation_ids), removed_files_count))
+
+
+def restore_backup_files(generation_id, pbix_workspaces_and_files=None):
+    """Restoring the original files from the #ORIGINALS BACKUP to the workspace directories.
+    The "latest" generation restores the newest backup of every file, otherwise the files from the specified generation are restored.
+    The list of the (workspace, report) pairs limits the restored files (-w --workspace and -r --report arguments)"""
+    print("\nRESTORING THE FILES FROM THE #ORIGINALS BACKUP")
+    generation_ids = get_backup_generations()
+    if generation_id != "latest" and generation_id not in generation_ids:
+        print("ERROR! There is no backup generation {}. Available generations:".format(generation_id))
+        for available_generation_id in generation_ids:
+            print(" * {}".format(available_generation_id))
+        return
+    backup_hashes = {}
+    for available_generation_id in (generation_ids if generation_id == "latest" else [generation_id]):
+        backup_hashes.update(load_backup_generation(available_generation_id))  # the newer generations override the older ones
+
+    selected_keys = None
+    if pbix_workspaces_and_files is not None:
+        selected_keys = set(get_manifest_key(ws_subdir, pbix_filename) for ws_subdir, pbix_filename in pbix_workspaces_and_files)
+    restored_files_count = 0
+    for key, content_hash in sorted(backup_hashes.items()):
+        if selected_keys is not None and key not in selected_keys:
+            continue
+        pbix_file_path = os.path.join(WORK_DIR_PATH, *key.split("/"))
+        os.makedirs(os.path.dirname(pbix_file_path), exist_ok=True)
+        # the restored file is a real copy: the report may be changed in place, and the backup file must stay unchanged
+        link_or_copy_file(get_backup_object_path(content_hash), pbix_file_path, link=False)
+        uprint("Restored .\\{}".format(shorten_dir_path(pbix_file_path)))
+        restored_files_count += 1
+    print("Restored files: {}".format(restored_files_count))
+
+
+# MANIFEST - STATE OF THE PROCESSED REPORTS
+def load_manifest():
+    # The manifest keeps the state of every processed report, so the unchanged reports are skipped on the next runs
+    # Structure: {"<workspace>/<report>": {"period", "content_hash", "result_hash", "size", "mtime_ns"}}
+    if not os.path.exists(MANIFEST_FILE_PATH):
+        return {}
+    with open(MANIFEST_FILE_PATH, "r", encoding="utf-8") as manifest_file:
+        return json.load(manifest_file)
+
+
+def save_manifest(manifest):
+    # The manifest is written to the temp file first, so the interrupted write doesn't corrupt the previous manifest
+    manifest_temp_file_path = MANIFEST_FILE_PATH + ".tmp"
+    with open(manifest_temp_file_path, "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, ensure_ascii=False)
+    os.replace(manifest_temp_file_path, MANIFEST_FILE_PATH)
+
+
+def get_manifest_key(ws_subdir, pbix_filename):
+    return "{}/{}".format(ws_subdir, pbix_filename)
+
+
+def get_file_hash(file_path):
+    file_hash = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in read_chunks(file, os.fstat(file.fileno()).st_size):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def get_report_hash(pbix_file_path, manifest_entry):
+    # The file is not read again, if its size and modification time are the same as for the result saved in the manifest.
+    # Returns the hash and the number of the bytes read
+    file_stat = os.stat(pbix_file_path)
+    if (manifest_entry 
+            and manifest_entry["size"] == file_stat.st_size 
+            and manifest_entry["mtime_ns"] == file_stat.st_mtime_ns):
+        return manifest_entry["result_hash"], 0
+    return get_file_hash(pbix_file_path), file_stat.st_size
+
+
+def get_patterns_hash(compiled_patterns):
+    # The same period label may be updated with the different patterns (for example, with the -o --oldYearValue argument),
+    # so the report is skipped only if it was updated with the same patterns and new values
+    _, patterns_and_new_values, _, _ = compiled_patterns
+    return hashlib.sha256(json.dumps(patterns_and_new_values, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def create_manifest_entry(period_label, patterns_hash, content_hash, result_pbix_file_path, result_hash=None):
+    file_stat = os.stat(result_pbix_file_path)
+    return {
+        "period": period_label,
+        "patterns_hash": patterns_hash,
+        "content_hash": content_hash,
+        "result_hash": result_hash if result_hash else get_file_hash(result_pbix_file_path),
+        "size": file_stat.st_size,
+        "mtime_ns": file_stat.st_mtime_ns
+    }
+
+
 # ARCHIVE OPERATIONS
 def unzip_pbix(src_pbix_file_path, pbix_temp_files_path):
     #To Do: Exception Handling
@@ -202,20 +669,45 @@ def unzip_pbix(src_pbix_file_path, pbix_temp_files_path):
                 shorten_dir_path(pbix_temp_files_path)))
 
 
-def zip_pbix(pbix_temp_files_path, result_pbix_file_path):
-    with ZipFile(result_pbix_file_path, mode="w") as result_archive:
-        for directory_path, _, filenames in os.walk(pbix_temp_files_path):
-            for filename in filenames:
-                # where the file is located in the file system
-                file_location_in_fs = os.path.join(directory_path, filename)
-                # path for the archive hierarchy
-                file_location_in_archive = file_location_in_fs[len(pbix_temp_files_path)+1:]
-                # selecting the compression mode depending on archive file type
-                file_compression_mode = zipfile.ZIP_STORED if filename == "DataModel" else zipfile.ZIP_DEFLATED
+def zip_pbix(pbix_temp_files_path, result_pbix_file_path, compress_workers=1):
+    """Archiving the temp files to the result .pbix file.
+    The deflated members are compressed in the thread pool (zlib releases the GIL), a few members ahead of the writer,
+    and are written to the archive as the already compressed bytes in the os.walk order, so the result doesn't depend on the threads.
+    The DataModel is stored without compression and is written by the writer itself, so it's never kept in memory"""
+    members = []
+    for directory_path, _, filenames in os.walk(pbix_temp_files_path):
+        for filename in filenames:
+            # where the file is located in the file system
+            file_location_in_fs = os.path.join(directory_path, filename)
+            # path for the archive hierarchy
+            file_location_in_archive = file_location_in_fs[len(pbix_temp_files_path)+1:]
+            # selecting the compression mode depending on archive file type
+            file_compression_mode = zipfile.ZIP_STORED if filename == "DataModel" else zipfile.ZIP_DEFLATED
+            members.append((file_location_in_fs, file_location_in_archive, file_compression_mode))
+
+    with ZipFile(result_pbix_file_path, mode="w") as result_archive, \
+            ThreadPoolExecutor(max_workers=compress_workers) as executor:
+        compressed_members = collections.deque()  # the futures of the members compressed ahead, in the archive order
+        members_to_compress = (member for member in members if member[2] == zipfile.ZIP_DEFLATED)
+        for file_location_in_fs, file_location_in_archive, file_compression_mode in members:
+            if file_compression_mode == zipfile.ZIP_STORED:
                 result_archive.write(
                     file_location_in_fs, 
                     arcname=file_location_in_archive, 
                     compress_type=file_compression_mode)
+                continue
+            while len(compressed_members) < compress_workers * COMPRESS_QUEUE_SIZE:
+                member_to_compress = next(members_to_compress, None)
+                if member_to_compress is None:
+                    break
+                compressed_members.append(executor.submit(compress_member, member_to_compress[0]))
+            crc, file_size, compressed_chunks = compressed_members.popleft().result()
+            result_zinfo = zipfile.ZipInfo.from_file(file_location_in_fs, arcname=file_location_in_archive)
+            result_zinfo.compress_type = file_compression_mode
+            result_zinfo.CRC = crc
+            result_zinfo.file_size = file_size
+            result_zinfo.compress_size = sum(len(chunk) for chunk in compressed_chunks)
+            write_raw_member(result_archive, result_zinfo, compressed_chunks)
     
     print('Archiving the temp files from .\\{} to .\\{}'
           .format(
@@ -223,37 +715,367 @@ def zip_pbix(pbix_temp_files_path, result_pbix_file_path):
             shorten_dir_path(result_pbix_file_path)))
 
 
+def compress_member(file_path):
+    # Compressing the file to the raw deflate data (without the zlib header), the same way as the zipfile module does it.
+    # Returns the CRC and the size of the file data and the list of the compressed chunks
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    crc, file_size, compressed_chunks = 0, 0, []
+    with open(file_path, "rb") as file:
+        for chunk in read_chunks(file, os.fstat(file.fileno()).st_size):
+            crc = zlib.crc32(chunk, crc)
+            file_size += len(chunk)
+            compressed_chunks.append(compressor.compress(chunk))
+    compressed_chunks.append(compressor.flush())
+    return crc, file_size, compressed_chunks
+
+
+def rewrite_pbix(src_pbix_file_path, result_pbix_file_path, compiled_patterns, literal_offsets=None):
+    """Rewriting the .pbix archive zip-to-zip, without the extraction to the #TEMP folder.
+    Only the Layout and [Content_Types].xml members are decoded and re-encoded (the Layout - in chunks).
+    All other members are copied as their already compressed bytes, so their CRCs are kept.
+    Returns the matches count per pattern and the Layout index of the result Layout"""
+    matches_counts, layout_index = None, None
+    with ZipFile(src_pbix_file_path, 'r') as source_archive, \
+            open(src_pbix_file_path, 'rb') as source_file, \
+            ZipFile(result_pbix_file_path, mode="w") as result_archive:
+        for source_zinfo in source_archive.infolist():
+            if source_zinfo.filename == SECURITY_BINDINGS_MEMBER_NAME:
+                print("Removed the SecurityBindings file")
+            elif source_zinfo.filename == CONTENT_TYPES_MEMBER_NAME:
+                xml = source_archive.read(source_zinfo)
+                updated_xml = xml.replace(SECURITY_BINDINGS_CONTENT_TYPE_RECORD.encode(), b"")
+                result_archive.writestr(copy_zip_info(source_zinfo), updated_xml, compress_type=zipfile.ZIP_DEFLATED)
+            elif source_zinfo.filename == LAYOUT_MEMBER_NAME:
+                print("Modifying the Layout file")
+                # The Layout is rewritten chunk by chunk straight into the result member (see replace_periods_in_stream)
+                result_zinfo = copy_zip_info(source_zinfo)
+                result_zinfo.compress_type = zipfile.ZIP_DEFLATED
+                with source_archive.open(source_zinfo) as source_layout, \
+                        result_archive.open(result_zinfo, mode="w") as result_layout:
+                    matches_counts, _, layout_index = replace_periods_in_stream(
+                        source_layout, result_layout, compiled_patterns, literal_offsets)
+                print_matches_counts(compiled_patterns, matches_counts)
+            else:
+                copy_raw_member(source_file, result_archive, source_zinfo)
+
+    print('Rewriting the archive .\\{} to .\\{}'
+          .format(
+            shorten_dir_path(src_pbix_file_path), 
+            shorten_dir_path(result_pbix_file_path)))
+    return matches_counts, layout_index
+
+
+def rewrite_pbix_for_periods(src_pbix_file_path, results_and_patterns, search_patterns, literal_offsets=None):
+    """Rewriting the .pbix archive zip-to-zip into several result archives at once - one archive per target period.
+    The source archive is read once: the untouched members (DataModel etc.) are read as the compressed bytes
+    and written to all the result archives, the [Content_Types].xml is updated once,
+    and the Layout is decompressed once into memory and rewritten with the patterns of every period.
+    results_and_patterns - the list of (result file path, period label, compiled patterns).
+    search_patterns - the compiled patterns, which literal regex is used to search the offsets of the period values for all the periods.
+    Returns the matches count per pattern for every result and the Layout index of the source Layout
+    (None, if the known literal_offsets were used)"""
+    matches_counts_per_result, source_layout_index = [], None
+    with contextlib.ExitStack() as archives_stack:
+        source_archive = archives_stack.enter_context(ZipFile(src_pbix_file_path, 'r'))
+        source_file = archives_stack.enter_context(open(src_pbix_file_path, 'rb'))
+        result_archives = [archives_stack.enter_context(ZipFile(result_pbix_file_path, mode="w")) 
+                           for result_pbix_file_path, _, _ in results_and_patterns]
+        for source_zinfo in source_archive.infolist():
+            if source_zinfo.filename == SECURITY_BINDINGS_MEMBER_NAME:
+                print("Removed the SecurityBindings file")
+            elif source_zinfo.filename == CONTENT_TYPES_MEMBER_NAME:
+                xml = source_archive.read(source_zinfo)
+                updated_xml = xml.replace(SECURITY_BINDINGS_CONTENT_TYPE_RECORD.encode(), b"")
+                for result_archive in result_archives:
+                    result_archive.writestr(copy_zip_info(source_zinfo), updated_xml, compress_type=zipfile.ZIP_DEFLATED)
+            elif source_zinfo.filename == LAYOUT_MEMBER_NAME:
+                layout_data = source_archive.read(source_zinfo)
+                if literal_offsets is None:
+                    # The offsets of the period values are searched once and used for all the periods
+                    _, _, source_layout_index = replace_periods_in_stream(io.BytesIO(layout_data), None, search_patterns)
+                    literal_offsets = source_layout_index["literal_offsets"]
+                for result_archive, (_, period_label, compiled_patterns) in zip(result_archives, results_and_patterns):
+                    print("Modifying the Layout file for the {} period".format(period_label))
+                    result_zinfo = copy_zip_info(source_zinfo)
+                    result_zinfo.compress_type = zipfile.ZIP_DEFLATED
+                    with result_archive.open(result_zinfo, mode="w") as result_layout:
+                        matches_counts, _, _ = replace_periods_in_stream(
+                            io.BytesIO(layout_data), result_layout, compiled_patterns, literal_offsets)
+                    print_matches_counts(compiled_patterns, matches_counts)
+                    matches_counts_per_result.append(matches_counts)
+            else:
+                copy_raw_member_to_archives(source_file, result_archives, source_zinfo)
+
+    print('Rewriting the archive .\\{} to {} archives'.format(shorten_dir_path(src_pbix_file_path), len(results_and_patterns)))
+    return matches_counts_per_result, source_layout_index
+
+
+def copy_zip_info(source_zinfo):
+    # Creating the archive record for the result archive with the same name, date and attributes as in the source archive.
+    # The extra field is not copied, because it may contain the ZIP64 sizes of the source member
+    result_zinfo = zipfile.ZipInfo(source_zinfo.filename, date_time=source_zinfo.date_time)
+    result_zinfo.compress_type = source_zinfo.compress_type
+    result_zinfo.comment = source_zinfo.comment
+    result_zinfo.create_system = source_zinfo.create_system
+    result_zinfo.internal_attr = source_zinfo.internal_attr
+    result_zinfo.external_attr = source_zinfo.external_attr
+    return result_zinfo
+
+
+def copy_raw_member(source_file, result_archive, source_zinfo):
+    # Copying the member as the already compressed bytes - the data is not decompressed and compressed again
+    copy_raw_member_to_archives(source_file, [result_archive], source_zinfo)
+
+
+def copy_raw_member_to_archives(source_file, result_archives, source_zinfo):
+    # The compressed bytes are read from the source once and written to every result archive (see rewrite_pbix_for_periods)
+    # The compressed data starts right after the local file header: 30 bytes + filename + extra field
+    source_file.seek(source_zinfo.header_offset)
+    filename_length, extra_length = struct.unpack("<26xHH", source_file.read(30))
+    source_file.seek(filename_length + extra_length, os.SEEK_CUR)
+
+    result_zinfos = []
+    for result_archive in result_archives:
+        result_zinfo = copy_zip_info(source_zinfo)
+        result_zinfo.CRC = source_zinfo.CRC
+        result_zinfo.compress_size = source_zinfo.compress_size
+        result_zinfo.file_size = source_zinfo.file_size
+        start_raw_member(result_archive, result_zinfo)
+        result_zinfos.append(result_zinfo)
+    for chunk in read_chunks(source_file, source_zinfo.compress_size):
+        for result_archive in result_archives:
+            result_archive.fp.write(chunk)
+    for result_archive, result_zinfo in zip(result_archives, result_zinfos):
+        end_raw_member(result_archive, result_zinfo)
+
+
+def read_chunks(file, size, chunk_size=RAW_COPY_CHUNK_SIZE):
+    while size > 0:
+        chunk = file.read(min(chunk_size, size))
+        if not chunk:
+            raise zipfile.BadZipFile("Unexpected end of the archive data")
+        size -= len(chunk)
+        yield chunk
+
+
+def write_raw_member(result_archive, result_zinfo, raw_chunks):
+    # The zipfile module doesn't provide an API to write the already compressed data,
+    # so the local file header and the data are written directly, and then the member is registered
+    # in the archive the same way as it is done by the ZipFile.writestr() method.
+    # The CRC and sizes must be set in the result_zinfo before the call
+    start_raw_member(result_archive, result_zinfo)
+    for chunk in raw_chunks:
+        result_archive.fp.write(chunk)
+    end_raw_member(result_archive, result_zinfo)
+
+
+def start_raw_member(result_archive, result_zinfo):
+    # Writing the local file header. The compressed data is written right after it
+    zip64 = result_zinfo.file_size > zipfile.ZIP64_LIMIT or result_zinfo.compress_size > zipfile.ZIP64_LIMIT
+    result_archive.fp.seek(result_archive.start_dir)
+    result_zinfo.header_offset = result_archive.fp.tell()
+    result_archive._writecheck(result_zinfo)
+    result_archive._didModify = True
+    result_archive.fp.write(result_zinfo.FileHeader(zip64))
+
+
+def end_raw_member(result_archive, result_zinfo):
+    # Registering the member, which data is written, in the central directory of the archive
+    result_archive.filelist.append(result_zinfo)
+    result_archive.NameToInfo[result_zinfo.filename] = result_zinfo
+    result_archive.start_dir = result_archive.fp.tell()
+
+
+# RESULT VERIFICATION
+# The JSON strings of the Layout (the Value expressions are inside them) and the longest text without the unterminated string
+JSON_STRING_REGEX = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+JSON_COMPLETE_PREFIX_REGEX = re.compile(r'(?:[^"]+|"[^"\\]*(?:\\.[^"\\]*)*")*')
+# The text outside the strings (replaced with "S"): the brackets, the numbers, true, false, null and the separators
+JSON_STRUCTURE_REGEX = re.compile(r'[\s,:0-9eE+\-.truefalsnS{}\[\]]*')
+JSON_NOT_BRACKETS_TABLE = {character: None for character in map(ord, ' \t\r\n,:0123456789eE+-.truefalsnS')}
+
+
+def check_layout_json(layout_stream, chunk_size=LAYOUT_CHUNK_SIZE):
+    """Checking the UTF-16-LE JSON structure of the Layout while it's decoded in chunks, so the Layout is never held in memory:
+    the data is valid UTF-16-LE, the strings are terminated, there are no unexpected characters outside the strings,
+    the brackets are balanced and there is the single top-level value.
+    The Value expressions are replaced inside the strings, so the check finds the broken rewrite without the full parse.
+    Raises ValueError with the details"""
+    decoder = codecs.getincrementaldecoder("utf-16-le")()
+    brackets = []
+    top_level_values = 0
+    text = ""
+    end_of_stream = False
+    while not end_of_stream:
+        chunk = layout_stream.read(chunk_size)
+        end_of_stream = not chunk
+        text += decoder.decode(chunk, final=end_of_stream)
+        if top_level_values == 0:
+            text = text.lstrip("\ufeff")
+        # the unterminated string at the end of the text continues in the next chunk
+        complete_text_end = JSON_COMPLETE_PREFIX_REGEX.match(text).end()
+        if end_of_stream and complete_text_end < len(text):
+            raise ValueError("unterminated string")
+        structure = JSON_STRING_REGEX.sub("S", text if complete_text_end == len(text) else text[:complete_text_end])
+        if not JSON_STRUCTURE_REGEX.fullmatch(structure):
+            raise ValueError("unexpected characters outside the strings")
+        for bracket in structure.translate(JSON_NOT_BRACKETS_TABLE):
+            if bracket in "{[":
+                if not brackets:
+                    top_level_values += 1
+                brackets.append(bracket)
+            elif not brackets or brackets.pop() + bracket not in ("{}", "[]"):
+                raise ValueError("unbalanced {}".format(bracket))
+        text = text[complete_text_end:]
+    if brackets or top_level_values != 1:
+        raise ValueError("the Layout isn't the single JSON object")
+
+
+def verify_result_pbix(src_pbix_file_path, result_pbix_file_path, check_data=True):
+    """Checking the result archive before it replaces the source file:
+    - the central directory of the result is readable and has the same members as the source, except the SecurityBindings;
+    - the local header of every member has the same name, compression and CRC as the central directory,
+      and the member data doesn't overlap the next member;
+    - the copied members have the same CRCs and sizes as the source members;
+    - if check_data is set (not --quickVerify), the data of the copied members matches their CRCs:
+      the raw bytes of the stored members (the DataModel) are checked without the decompression,
+      the compressed members are decompressed (their CRCs are checked by the zipfile module).
+      The whole result is read, so the check costs about as much I/O as the rewrite itself;
+    - the Layout is the valid UTF-16-LE JSON (checked in chunks, see check_layout_json),
+      the [Content_Types].xml has no SecurityBindings record.
+    Raises the zipfile.BadZipFile with the details, so the file goes to the #ERRORS. Returns the number of the bytes read"""
+    def verification_error(message):
+        return zipfile.BadZipFile("Result verification failed ({}): {}".format(os.path.basename(result_pbix_file_path), message))
+
+    with ZipFile(src_pbix_file_path, 'r') as source_archive:
+        source_zinfos = {zinfo.filename: zinfo for zinfo in source_archive.infolist()}
+    bytes_read = 0
+    data_offsets = {}
+    with ZipFile(result_pbix_file_path, 'r') as result_archive, open(result_pbix_file_path, 'rb') as result_file:
+        result_zinfos = {zinfo.filename: zinfo for zinfo in result_archive.infolist()}
+        if SECURITY_BINDINGS_MEMBER_NAME in result_zinfos:
+            raise verification_error("the SecurityBindings file is not removed")
+        missing_members = set(source_zinfos) - set(result_zinfos) - {SECURITY_BINDINGS_MEMBER_NAME}
+        extra_members = set(result_zinfos) - set(source_zinfos)
+        if missing_members or extra_members:
+            raise verification_error("the members are different from the source: missing {}, extra {}".format(
+                sorted(missing_members), sorted(extra_members)))
+
+        # The local headers, in the order of the data in the file
+        result_zinfos_by_offset = sorted(result_zinfos.values(), key=lambda zinfo: zinfo.header_offset)
+        for zinfo_index, zinfo in enumerate(result_zinfos_by_offset):
+            result_file.seek(zinfo.header_offset)
+            local_header = result_file.read(30)
+            if len(local_header) < 30:
+                raise verification_error("the local header of {} is truncated".format(zinfo.filename))
+            (signature, _, _, flag_bits, compress_type, _, _, crc, _, _, 
+             filename_length, extra_length) = struct.unpack("<4s2B4HL2L2H", local_header)
+            filename = result_file.read(filename_length).decode("utf-8" if flag_bits & 0x800 else "cp437")
+            if signature != b"PK\x03\x04" or filename != zinfo.filename or compress_type != zinfo.compress_type:
+                raise verification_error("the local header of {} doesn't match the central directory".format(zinfo.filename))
+            if not flag_bits & 0x08 and crc != zinfo.CRC:
+                raise verification_error("the local header CRC of {} doesn't match the central directory".format(zinfo.filename))
+            data_offsets[zinfo.filename] = zinfo.header_offset + 30 + filename_length + extra_length
+            data_end = data_offsets[zinfo.filename] + zinfo.compress_size
+            next_header_offset = (result_zinfos_by_offset[zinfo_index + 1].header_offset 
+                                  if zinfo_index + 1 < len(result_zinfos_by_offset) else result_archive.start_dir)
+            if data_end > next_header_offset:
+                raise verification_error("the data of {} overlaps the next member".format(zinfo.filename))
+            bytes_read += 30 + filename_length
+
+        for filename, zinfo in result_zinfos.items():
+            if filename == LAYOUT_MEMBER_NAME:
+                try:
+                    with result_archive.open(zinfo) as result_layout:
+                        check_layout_json(result_layout)
+                except ValueError as e:
+                    raise verification_error("the Layout is not valid UTF-16-LE JSON: {}".format(e))
+                bytes_read += zinfo.compress_size
+            elif filename == CONTENT_TYPES_MEMBER_NAME:
+                if SECURITY_BINDINGS_CONTENT_TYPE_RECORD.encode() in result_archive.read(zinfo):
+                    raise verification_error("the SecurityBindings record is not removed from the [Content_Types].xml")
+                bytes_read += zinfo.compress_size
+            elif zinfo.CRC != source_zinfos[filename].CRC or zinfo.file_size != source_zinfos[filename].file_size:
+                raise verification_error("the CRC or size of {} is different from the source".format(filename))
+            elif not check_data:
+                continue
+            elif zinfo.compress_type == zipfile.ZIP_STORED:
+                # the stored data is the member content itself, so its CRC is computed from the raw bytes
+                result_file.seek(data_offsets[filename])
+                data_crc = 0
+                for chunk in read_chunks(result_file, zinfo.compress_size):
+                    data_crc = zlib.crc32(chunk, data_crc)
+                if data_crc != zinfo.CRC:
+                    raise verification_error("the data of {} doesn't match its CRC".format(filename))
+                bytes_read += zinfo.compress_size
+            else:
+                try:
+                    with result_archive.open(zinfo) as member_file:
+                        while member_file.read(RAW_COPY_CHUNK_SIZE):
+                            pass
+                except (zipfile.BadZipFile, zlib.error) as e:
+                    raise verification_error("the data of {} is corrupted: {}".format(filename, e))
+                bytes_read += zinfo.compress_size
+    return bytes_read
+
+
 # PBIX MODIFICATION
 def remove_security_bindings_data(pbix_temp_files_path):
     """Deleting the PBI report's Control Sum Data. The control sum is located in the SecurityBindings file.
     The deletion of this data enables us to open the PBI report even if the changes were made outside Power BI Desktop"""
     
     # Removing the SecurityBindings file
-    security_bindings_file_path = os.path.join(pbix_temp_files_path, "SecurityBindings")
+    security_bindings_file_path = os.path.join(pbix_temp_files_path, SECURITY_BINDINGS_MEMBER_NAME)
     if os.path.exists(security_bindings_file_path):
         os.remove(security_bindings_file_path)
 
     # Removing the XML record about the SecurityBingings file from the [Content_Types].xml file
     # Optional step - in most cases, it is enough to delete only the SecurityBindings file
-    content_types_file_path = os.path.join(pbix_temp_files_path, "[Content_Types].xml")
+    content_types_file_path = os.path.join(pbix_temp_files_path, CONTENT_TYPES_MEMBER_NAME)
     with open(content_types_file_path, "r") as content_types_file:
         xml = content_types_file.read()
-    updated_xml = xml.replace('<Override PartName="/SecurityBindings" ContentType="" />', "")
+    updated_xml = xml.replace(SECURITY_BINDINGS_CONTENT_TYPE_RECORD, "")
     with open(content_types_file_path, "w") as content_types_file: # overwriting the file
         content_types_file.write(updated_xml)
     
     print("Removed the SecurityBindings file")
 
 
-def get_patterns_and_replacements(cli_arg_year, cli_arg_month, cli_arg_old_year):
+def get_new_period(cli_arg_year, cli_arg_month):
     if not cli_arg_month and not cli_arg_year:
         # If the user didn't provide the new Year and Month values in the CLI
         # the script takes the previous month from today as the new value
         current_date = datetime.date.today()
-        period_for_new_values = current_date - datetime.timedelta(days=current_date.day)
-    else:
-        # If the user provides the new value, the script uses user's value
-        period_for_new_values = datetime.date(cli_arg_year, cli_arg_month, 1)
+        return current_date - datetime.timedelta(days=current_date.day)
+    # If the user provides the new value, the script uses user's value
+    return datetime.date(cli_arg_year, cli_arg_month, 1)
+
+
+def get_batch_periods(cli_arg_periods):
+    """Parsing the target periods of the batch mode (-P --periods).
+    The periods are separated by commas, the range is set by its first and last periods separated by a colon.
+    Example: 2023-11,2024-01:2024-03 -> 2023-11, 2024-01, 2024-02, 2024-03"""
+    periods = []
+    for periods_item in cli_arg_periods.split(","):
+        first_period_str, _, last_period_str = periods_item.strip().partition(":")
+        period = datetime.datetime.strptime(first_period_str.strip(), "%Y-%m").date()
+        last_period = datetime.datetime.strptime(last_period_str.strip(), "%Y-%m").date() if last_period_str else period
+        if last_period < period:
+            raise ValueError("The range {} ends before it starts".format(periods_item.strip()))
+        while period <= last_period:
+            if period not in periods:
+                periods.append(period)
+            period = (period + datetime.timedelta(days=31)).replace(day=1)  # the first day of the next month
+    return periods
+
+
+def format_period(period):
+    # The period label, which is saved to the manifest. Example: 2024-01
+    return period.strftime("%Y-%m")
+
+
+def get_patterns_and_replacements(cli_arg_year, cli_arg_month, cli_arg_old_year):
+    period_for_new_values = get_new_period(cli_arg_year, cli_arg_month)
 
     new_value_year = period_for_new_values.year
     new_value_month = period_for_new_values.month
@@ -293,29 +1115,775 @@ def create_value_expression(value):
     return r'\\"Value\\":\\"{}\\"'.format(value)
 
 
-def replace_period(text, period_pattern, period_new_value):
-    # The should be deffirent for search and replacement operations
-    search_pattern = create_value_expression(period_pattern)
-    new_value = create_value_expression(period_new_value)
-    return re.sub(search_pattern, new_value, text)
-
-
-def modify_layout_file(pbix_temp_files_path, patterns_and_new_values):
+def compile_period_patterns(patterns_and_new_values):
+    """Compiling all the period patterns into one regular expression, so the Layout is rewritten in a single pass.
+    Every pattern becomes a named alternative (p0, p1, ...) inside the common Value expression.
+    Adding a new kind of period values only requires a new entry in get_patterns_and_replacements()"""
+    alternatives = "|".join("(?P<p{}>{})".format(pattern_index, pattern)
+                            for pattern_index, (pattern, _) in enumerate(patterns_and_new_values))
+    period_regex = re.compile(create_value_expression("(?:{})".format(alternatives)))
+    # The replacements are the literal strings - the same Value expression as in the Layout file, without the regex escaping
+    new_value_expressions = [r'\"Value\":\"{}\"'.format(new_value) for _, new_value in patterns_and_new_values]
+    # The Value expressions, which may contain the period values. Their offsets are saved to the Layout index,
+    # so the index is valid only for the same expression (see load_layout_index)
+    literal_regex = re.compile(create_value_expression("(?:{})".format(
+        "|".join(dict.fromkeys(pattern for pattern, _ in patterns_and_new_values)))))
+    return period_regex, patterns_and_new_values, new_value_expressions, literal_regex
+
+
+def replace_periods_in_stream(source_stream, result_stream, compiled_patterns, literal_offsets=None, chunk_size=LAYOUT_CHUNK_SIZE):
+    """Replacing the period values while copying the UTF-16-LE Layout data from the source to the result stream.
+    The data is read and written in chunks, so the memory usage doesn't depend on the Layout size.
+    The last LAYOUT_OVERLAP_SIZE characters of every chunk are kept for the next chunk,
+    so the Value expressions split between two chunks are found as well.
+    The period patterns are checked only at the offsets of the Value expressions with possible period values.
+    The offsets are searched with the literal regex of the patterns or taken from the Layout index (literal_offsets), if it is known.
+    If the result stream is None, the matches are only counted.
+    Returns the matches count and the count of the matches with a different value than the new one, per pattern,
+    and the Layout index of the result data (of the source data, if the matches are only counted)"""
+    period_regex, patterns_and_new_values, new_value_expressions, literal_regex = compiled_patterns
+    matches_counts = [0] * len(patterns_and_new_values)
+    changes_counts = [0] * len(patterns_and_new_values)
+    layout_index = {"crc": 0, "size": 0, "literal_regex": literal_regex.pattern, "literal_offsets": []}
+    next_literal_index = 0  # the position in the literal_offsets list
+    # The incremental decoder keeps the incomplete characters (odd bytes, surrogate pairs) at the end of the chunk
+    decoder = codecs.getincrementaldecoder("utf-16-le")()
+    text = ""
+    text_offset = 0  # the offset of the text start in the source data (characters)
+    result_offset = 0  # the offset of the text start in the result data (characters)
+    end_of_stream = False
+    while not end_of_stream:
+        chunk = source_stream.read(chunk_size)
+        end_of_stream = not chunk
+        text += decoder.decode(chunk, final=end_of_stream)
+
+        # The matches, which start in the overlap window, are searched again after the next chunk is added
+        search_end = len(text) if end_of_stream else max(len(text) - LAYOUT_OVERLAP_SIZE, 0)
+        if literal_offsets is None:
+            literal_starts = []
+            for literal_match in literal_regex.finditer(text):
+                if literal_match.start() >= search_end:
+                    break
+                literal_starts.append(literal_match.start())
+        else:
+            literal_starts = []
+            while (next_literal_index < len(literal_offsets) 
+                    and literal_offsets[next_literal_index] - text_offset < search_end):
+                literal_starts.append(literal_offsets[next_literal_index] - text_offset)
+                next_literal_index += 1
+
+        result_parts = []
+        written_end = 0
+        for literal_start in literal_starts:
+            layout_index["literal_offsets"].append(result_offset + literal_start)
+            match = period_regex.match(text, literal_start)
+            if match is None:
+                continue
+            pattern_index = int(match.lastgroup[1:])
+            matches_counts[pattern_index] += 1
+            if match.group() != new_value_expressions[pattern_index]:
+                changes_counts[pattern_index] += 1
+            if result_stream is None:
+                continue
+            result_parts.append(text[written_end:match.start()])
+            result_parts.append(new_value_expressions[pattern_index])
+            # the next literals are shifted, if the new value has the different length (for example, '9月' -> '10月')
+            result_offset += len(new_value_expressions[pattern_index]) - len(match.group())
+            written_end = match.end()
+        # The text before the overlap window is written, the rest is kept for the next chunk
+        result_parts.append(text[written_end:search_end])
+        written_end = max(written_end, search_end)
+        text_offset += written_end
+        result_offset += written_end
+        if result_stream is not None:
+            result_data = "".join(result_parts).encode("utf-16-le")
+            result_stream.write(result_data)
+        else:
+            result_data = chunk
+        layout_index["crc"] = zlib.crc32(result_data, layout_index["crc"])
+        layout_index["size"] += len(result_data)
+        text = text[written_end:]
+    return matches_counts, changes_counts, layout_index
+
+
+def get_layout_changes_count(src_pbix_file_path, compiled_patterns, literal_offsets=None):
+    # Counting the period values, which would be changed in the Layout file. Only the Layout member is read from the archive.
+    # Returns the count and the Layout index of the source Layout.
+    # If the archive can't be read, the count is unknown (None) and the file is processed, so the error is handled as usual
+    try:
+        with ZipFile(src_pbix_file_path, 'r') as source_archive, source_archive.open(LAYOUT_MEMBER_NAME) as source_layout:
+            _, changes_counts, layout_index = replace_periods_in_stream(source_layout, None, compiled_patterns, literal_offsets)
+    except Exception:
+        return None, None
+    return sum(changes_counts), layout_index
+
+
+# LAYOUT INDEX - OFFSETS OF THE PERIOD VALUES
+def get_layout_index_path(ws_subdir, pbix_filename):
+    return os.path.join(INDEX_DIR_PATH, ws_subdir, pbix_filename[:-5] + ".json")
+
+
+def load_layout_index(ws_subdir, pbix_filename, compiled_patterns):
+    """Loading the offsets of the Value expressions with possible period values in the Layout of the .pbix file.
+    The index is valid only for the same Layout data: the CRC and the size of the Layout member are compared
+    with the values from the archive's central directory, so the Layout is not read for the check.
+    The offsets must be searched with the same literal regex as the one of the compiled patterns.
+    Returns the list of offsets or None, if there is no valid index and the Layout should be searched"""
+    layout_index_path = get_layout_index_path(ws_subdir, pbix_filename)
+    if not os.path.exists(layout_index_path):
+        return None
+    try:
+        with open(layout_index_path, "r", encoding="utf-8") as layout_index_file:
+            layout_index = json.load(layout_index_file)
+        with ZipFile(os.path.join(WORK_DIR_PATH, ws_subdir, pbix_filename), 'r') as source_archive:
+            layout_zinfo = source_archive.getinfo(LAYOUT_MEMBER_NAME)
+    except Exception:
+        return None
+    _, _, _, literal_regex = compiled_patterns
+    if (layout_index["crc"] != layout_zinfo.CRC or layout_index["size"] != layout_zinfo.file_size
+            or layout_index.get("literal_regex") != literal_regex.pattern):
+        return None
+    return layout_index["literal_offsets"]
+
+
+def save_layout_index(ws_subdir, pbix_filename, layout_index):
+    layout_index_path = get_layout_index_path(ws_subdir, pbix_filename)
+    os.makedirs(os.path.dirname(layout_index_path), exist_ok=True)
+    with open(layout_index_path, "w", encoding="utf-8") as layout_index_file:
+        json.dump(layout_index, layout_index_file)
+
+
+def modify_layout_file(pbix_temp_files_path, compiled_patterns, literal_offsets=None):
     print("Modifying the Layout file")
 
-    layout_file_path = os.path.join(pbix_temp_files_path, "Report", "Layout")
+    layout_file_path = os.path.join(pbix_temp_files_path, *LAYOUT_MEMBER_NAME.split("/"))
+    result_layout_file_path = layout_file_path + ".tmp"
 
     # It is crucial to keep the UTF-16-LE encoding for the Layout file.
     # Otherwise the PBI Desktop won't be able to read and open the .pbix file correclty
-    with open(layout_file_path, "r", encoding="utf-16-le") as layout_file:
-        layout_data = layout_file.read()
+    with open(layout_file_path, "rb") as layout_file, open(result_layout_file_path, "wb") as result_layout_file:
+        matches_counts, _, layout_index = replace_periods_in_stream(layout_file, result_layout_file, compiled_patterns, literal_offsets)
+    os.replace(result_layout_file_path, layout_file_path)
+    print_matches_counts(compiled_patterns, matches_counts)
+    return matches_counts, layout_index
+
+
+# INSTRUMENTATION - STAGE TIMINGS AND I/O
+@contextlib.contextmanager
+def measure_stage(stage_records, stage_name):
+    """Measuring the wall time of the processing stage. The stage code adds the I/O values to the yielded record:
+    bytes_read, bytes_written, compressed_size, uncompressed_size, matches (per pattern).
+    The zip-to-zip rewrite stages add the sizes of the result archives as well: result_compressed_size, result_uncompressed_size"""
+    stage_record = {"stage": stage_name}
+    start_time = time.perf_counter()
+    try:
+        yield stage_record
+    finally:
+        stage_record["seconds"] = round(time.perf_counter() - start_time, 6)
+        stage_records.append(stage_record)
+
+
+def get_archive_sizes(pbix_file_path):
+    # The total compressed and uncompressed sizes of the archive members (from the central directory only)
+    with ZipFile(pbix_file_path, 'r') as archive:
+        members = archive.infolist()
+    return sum(zinfo.compress_size for zinfo in members), sum(zinfo.file_size for zinfo in members)
+
+
+def get_matches_by_pattern(compiled_patterns, matches_counts):
+    _, patterns_and_new_values, _, _ = compiled_patterns
+    return {pattern: matches_count for (pattern, _), matches_count in zip(patterns_and_new_values, matches_counts)}
+
+
+def save_run_report(run_report_file_path, run_record, processing_results):
+    """Appending the JSON lines of the run to the run report file (-R --runReport):
+    one line per stage of every report, one line per report and the run summary with the totals per stage"""
+    stage_totals = {}
+    with open(run_report_file_path, "a", encoding="utf-8") as run_report_file:
+        for result in processing_results:
+            for stage_record in result.get("stages", []):
+                report_stage_record = {"type": "stage", "run": run_record["run"], 
+                                       "workspace": result["workspace"], "report": result["report"]}
+                report_stage_record.update(stage_record)
+                run_report_file.write(json.dumps(report_stage_record, ensure_ascii=False) + "\n")
+                stage_total = stage_totals.setdefault(stage_record["stage"], {"seconds": 0, "bytes_read": 0, "bytes_written": 0})
+                for key in stage_total:
+                    stage_total[key] += stage_record.get(key, 0)
+            report_record = {"type": "report", "run": run_record["run"]}
+            report_record.update({key: value for key, value in result.items() if key not in ("stages", "manifest_entry")})
+            run_report_file.write(json.dumps(report_record, ensure_ascii=False) + "\n")
+        for stage_total in stage_totals.values():
+            stage_total["seconds"] = round(stage_total["seconds"], 6)
+        run_summary_record = {"type": "run"}
+        run_summary_record.update(run_record, stages=stage_totals)
+        run_report_file.write(json.dumps(run_summary_record, ensure_ascii=False) + "\n")
+    print("Saved the run report to {}".format(run_report_file_path))
+
+
+# REPORTS PROCESSING
+def process_pbix_file(ws_subdir, pbix_filename, cli_args, compiled_patterns, manifest_entry=None):
+    """Processing of the single .pbix file: the backup, the modification and the replacement of the source file with the result.
+    The file is skipped, if it was already updated to the new period or there are no period values to change in its Layout.
+    Returns the processing result of the file for the end-of-run summary and the manifest"""
+    print_file_name(ws_subdir, pbix_filename)
+
+    # Paths to src and backup files, temp directory. Source file will be replaced by the Result file in root directory
+    pbix_file_path = os.path.join(WORK_DIR_PATH, ws_subdir, pbix_filename)
+    pbix_temp_files_path = os.path.join(TEMP_DIR_PATH, ws_subdir, pbix_filename[:-5])
+    pbix_error_file_path = os.path.join(ERRORS_DIR_PATH, ws_subdir, pbix_filename)
+    processing_result = {"workspace": ws_subdir, "report": pbix_filename, "status": "OK"}
+    stage_records = processing_result["stages"] = []
+    start_time = time.perf_counter()
+
+    # Checking if the file should be processed at all (the -f --force argument disables the check)
+    period_label = format_period(get_new_period(cli_args.year, cli_args.month))
+    patterns_hash = get_patterns_hash(compiled_patterns)
+    # The source file may be locked (for example, by the exporter) or removed, so the hash and the backup are in the try block as well
+    pbix_backup_file_path = None
+    pbix_temp_file_path = pbix_temp_files_path + ".pbix"
+    try:
+        with measure_stage(stage_records, "hash") as stage_record:
+            content_hash, hash_bytes_read = get_report_hash(pbix_file_path, manifest_entry)
+            stage_record.update(bytes_read=hash_bytes_read)
+        if (not cli_args.force
+                and manifest_entry 
+                and manifest_entry["period"] == period_label 
+                and manifest_entry.get("patterns_hash") == patterns_hash
+                and manifest_entry["result_hash"] == content_hash):
+            print("Skipped the file: it is already updated to the {} period".format(period_label))
+            processing_result.update(status="SKIPPED", manifest_entry=manifest_entry, 
+                                     seconds=round(time.perf_counter() - start_time, 6))
+            return processing_result
+
+        # The offsets of the period values from the previous run (None, if the Layout was changed since then)
+        literal_offsets = load_layout_index(ws_subdir, pbix_filename, compiled_patterns)
+        if literal_offsets is not None:
+            print("Using the Layout index: {} period values offsets".format(len(literal_offsets)))
+        if not cli_args.force:
+            with measure_stage(stage_records, "layout_check") as stage_record:
+                layout_changes_count, layout_index = get_layout_changes_count(pbix_file_path, compiled_patterns, literal_offsets)
+                stage_record.update(bytes_read=layout_index["size"] if layout_index else 0, changes=layout_changes_count)
+            if layout_changes_count == 0:
+                save_layout_index(ws_subdir, pbix_filename, layout_index)
+                print("Skipped the file: there are no period values to change in the Layout")
+                processing_result.update(status="SKIPPED", 
+                                         manifest_entry=create_manifest_entry(period_label, patterns_hash, content_hash, pbix_file_path, 
+                                                                               content_hash),
+                                         seconds=round(time.perf_counter() - start_time, 6))
+                return processing_result
+            if layout_index is not None:
+                # The offsets found by the check are used for the modification, so the Layout is not searched again
+                literal_offsets = layout_index["literal_offsets"]
 
-    for pattern, new_value in patterns_and_new_values:
-        uprint("\t{} -> {}: {} matches".format(pattern, new_value, len(re.findall(pattern, layout_data))))
-        layout_data = replace_period(layout_data, pattern, new_value)
+        # Creating the file backup - moving the original file to the #ORIGINALS BACKUP
+        with measure_stage(stage_records, "backup") as stage_record:
+            # nothing is read and written, if the file is already in the backup store or hardlinked
+            pbix_backup_file_path, backup_copied_bytes = backup_original_file(pbix_file_path, content_hash)
+            stage_record.update(bytes_read=backup_copied_bytes, bytes_written=backup_copied_bytes)
+            processing_result.update(backup_hash=content_hash)
+            record_backup_file(ws_subdir, pbix_filename, content_hash)
     
-    with open(layout_file_path, "w", encoding="utf-16-le") as layout_file:
-        layout_file.write(layout_data)
+        # Processing of the selected file
+        # The result archive is written to root/#TEMP and replaces the source file by the rename,
+        # so the source file (which may be hardlinked to the backup) is never overwritten
+        source_compressed_size, source_uncompressed_size = get_archive_sizes(pbix_file_path)
+        if cli_args.stream:
+            # rewriting the archive from root to root/#TEMP
+            with measure_stage(stage_records, "rewrite") as stage_record:
+                matches_counts, layout_index = rewrite_pbix(pbix_file_path, pbix_temp_file_path, compiled_patterns, literal_offsets)
+                result_compressed_size, result_uncompressed_size = get_archive_sizes(pbix_temp_file_path)
+                stage_record.update(bytes_read=os.path.getsize(pbix_file_path), bytes_written=os.path.getsize(pbix_temp_file_path),
+                                    compressed_size=source_compressed_size, uncompressed_size=source_uncompressed_size,
+                                    result_compressed_size=result_compressed_size, result_uncompressed_size=result_uncompressed_size,
+                                    matches=get_matches_by_pattern(compiled_patterns, matches_counts))
+            with measure_stage(stage_records, "verify") as stage_record:
+                stage_record.update(bytes_read=verify_result_pbix(pbix_file_path, pbix_temp_file_path, not cli_args.quickVerify))
+            replace_file(pbix_temp_file_path, pbix_file_path)
+        else:
+            if os.path.exists(pbix_temp_files_path):
+                shutil.rmtree(pbix_temp_files_path)  # the files left by the interrupted run must not get into the result archive
+            with measure_stage(stage_records, "unzip") as stage_record:
+                unzip_pbix(pbix_file_path, pbix_temp_files_path)  # unzipping from root/#ORIGINALS BACKUP to root/#TEMP
+                stage_record.update(bytes_read=os.path.getsize(pbix_file_path), bytes_written=source_uncompressed_size,
+                                    compressed_size=source_compressed_size, uncompressed_size=source_uncompressed_size)
+            with measure_stage(stage_records, "remove_security_bindings"):
+                remove_security_bindings_data(pbix_temp_files_path)  # removing check sum data
+            with measure_stage(stage_records, "modify_layout") as stage_record:
+                stage_record.update(bytes_read=os.path.getsize(os.path.join(pbix_temp_files_path, *LAYOUT_MEMBER_NAME.split("/"))))
+                matches_counts, layout_index = modify_layout_file(pbix_temp_files_path, compiled_patterns, literal_offsets)  # replacing the slicers values
+                stage_record.update(bytes_written=layout_index["size"],
+                                    matches=get_matches_by_pattern(compiled_patterns, matches_counts))
+            with measure_stage(stage_records, "zip") as stage_record:
+                # zipping file from root/#TEMP/<report> to root/#TEMP, the CPU cores are shared by the worker processes (-j --jobs)
+                zip_pbix(pbix_temp_files_path, pbix_temp_file_path, max((os.cpu_count() or 1) // cli_args.jobs, 1))
+                result_compressed_size, result_uncompressed_size = get_archive_sizes(pbix_temp_file_path)
+                stage_record.update(bytes_read=result_uncompressed_size, bytes_written=os.path.getsize(pbix_temp_file_path),
+                                    compressed_size=result_compressed_size, uncompressed_size=result_uncompressed_size)
+            with measure_stage(stage_records, "verify") as stage_record:
+                stage_record.update(bytes_read=verify_result_pbix(pbix_file_path, pbix_temp_file_path, not cli_args.quickVerify))
+            replace_file(pbix_temp_file_path, pbix_file_path)
+        save_layout_index(ws_subdir, pbix_filename, layout_index)
+        with measure_stage(stage_records, "result_hash") as stage_record:
+            processing_result.update(manifest_entry=create_manifest_entry(period_label, patterns_hash, content_hash, pbix_file_path))
+            stage_record.update(bytes_read=os.path.getsize(pbix_file_path))
+
+    # If there are any errors, the original file is copied to the # ERRORS folder
+    except zipfile.BadZipFile as bad_zip_exception:
+        save_error_file(pbix_file_path, pbix_backup_file_path, pbix_error_file_path)
+        print("Invalid zip file: " + pbix_filename)
+        print(str(bad_zip_exception))
+        processing_result.update(status="ERROR", error=str(bad_zip_exception))
+    except Exception as e:
+        save_error_file(pbix_file_path, pbix_backup_file_path, pbix_error_file_path)
+        print("Error with " + pbix_filename)
+        print(str(e))
+        processing_result.update(status="ERROR", error=str(e))
+    processing_result.update(seconds=round(time.perf_counter() - start_time, 6))
+    return processing_result
+
+
+def process_pbix_file_for_periods(ws_subdir, pbix_filename, cli_args, periods_and_patterns, manifest_entry=None):
+    """Batch processing of the single .pbix file for several target periods (-P --periods).
+    The source file is read once and is left unchanged, the result file of every period is saved
+    to the #RESULTS/<period>/<workspace> folder. The manifest and the backup are not used, because the source isn't replaced.
+    periods_and_patterns - the list of (period label, compiled patterns).
+    Returns the processing result of the file for the end-of-run summary"""
+    print_file_name(ws_subdir, pbix_filename)
+
+    pbix_file_path = os.path.join(WORK_DIR_PATH, ws_subdir, pbix_filename)
+    pbix_error_file_path = os.path.join(ERRORS_DIR_PATH, ws_subdir, pbix_filename)
+    processing_result = {"workspace": ws_subdir, "report": pbix_filename, "status": "OK",
+                         "periods": [period_label for period_label, _ in periods_and_patterns]}
+    stage_records = processing_result["stages"] = []
+    start_time = time.perf_counter()
+
+    # The result archives are written to root/#TEMP and moved to root/#RESULTS/<period>/<workspace> by the rename
+    results_and_patterns = [(os.path.join(TEMP_DIR_PATH, ws_subdir, "{}.{}.pbix".format(pbix_filename[:-5], period_label)), 
+                             period_label, compiled_patterns)
+                            for period_label, compiled_patterns in periods_and_patterns]
+    # The offsets are searched once for all the periods, so the literal regex covers the patterns of every period
+    search_patterns = compile_period_patterns([pattern_and_new_value for _, (_, patterns_and_new_values, _, _) in periods_and_patterns
+                                               for pattern_and_new_value in patterns_and_new_values])
+    try:
+        literal_offsets = load_layout_index(ws_subdir, pbix_filename, search_patterns)
+        if literal_offsets is not None:
+            print("Using the Layout index: {} period values offsets".format(len(literal_offsets)))
+        with measure_stage(stage_records, "rewrite_periods") as stage_record:
+            matches_counts_per_result, layout_index = rewrite_pbix_for_periods(pbix_file_path, results_and_patterns, search_patterns,
+                                                                               literal_offsets)
+            source_compressed_size, source_uncompressed_size = get_archive_sizes(pbix_file_path)
+            results_sizes = [get_archive_sizes(result_pbix_file_path) for result_pbix_file_path, _, _ in results_and_patterns]
+            stage_record.update(bytes_read=os.path.getsize(pbix_file_path),
+                                bytes_written=sum(os.path.getsize(result_pbix_file_path) 
+                                                  for result_pbix_file_path, _, _ in results_and_patterns),
+                                compressed_size=source_compressed_size, uncompressed_size=source_uncompressed_size,
+                                result_compressed_size=sum(compressed_size for compressed_size, _ in results_sizes),
+                                result_uncompressed_size=sum(uncompressed_size for _, uncompressed_size in results_sizes),
+                                matches={period_label: get_matches_by_pattern(compiled_patterns, matches_counts) 
+                                         for (_, period_label, compiled_patterns), matches_counts 
+                                         in zip(results_and_patterns, matches_counts_per_result)})
+        if layout_index is not None:
+            save_layout_index(ws_subdir, pbix_filename, layout_index)  # the source Layout isn't changed, so the index stays valid
+        with measure_stage(stage_records, "verify") as stage_record:
+            # all the results are verified before any of them is saved
+            stage_record.update(bytes_read=sum(verify_result_pbix(pbix_file_path, pbix_temp_file_path, not cli_args.quickVerify) 
+                                               for pbix_temp_file_path, _, _ in results_and_patterns))
+        for pbix_temp_file_path, period_label, _ in results_and_patterns:
+            result_pbix_file_path = os.path.join(RESULTS_DIR_PATH, period_label, ws_subdir, pbix_filename)
+            os.makedirs(os.path.dirname(result_pbix_file_path), exist_ok=True)
+            replace_file(pbix_temp_file_path, result_pbix_file_path)
+            uprint("Saved the result file .\\{}".format(shorten_dir_path(result_pbix_file_path)))
+
+    # If there are any errors, the source file is copied to the # ERRORS folder
+    except zipfile.BadZipFile as bad_zip_exception:
+        copy_error_file(pbix_file_path, pbix_error_file_path)
+        print("Invalid zip file: " + pbix_filename)
+        print(str(bad_zip_exception))
+        processing_result.update(status="ERROR", error=str(bad_zip_exception))
+    except Exception as e:
+        copy_error_file(pbix_file_path, pbix_error_file_path)
+        print("Error with " + pbix_filename)
+        print(str(e))
+        processing_result.update(status="ERROR", error=str(e))
+    processing_result.update(seconds=round(time.perf_counter() - start_time, 6))
+    return processing_result
+
+
+def process_pbix_file_with_profiler(ws_subdir, pbix_filename, cli_args, compiled_patterns, manifest_entry=None):
+    """The optional hook for the profiler (-p --profile): the processing of the file is run under cProfile
+    and the stats are saved to the <profile directory>/<workspace>__<report>.prof file.
+    The stats files can be explored with the pstats module or with the tools like snakeviz.
+    In the batch mode (-P --periods) the compiled_patterns are the list of (period label, compiled patterns)"""
+    process_function = process_pbix_file_for_periods if cli_args.periods else process_pbix_file
+    if not cli_args.profile:
+        return process_function(ws_subdir, pbix_filename, cli_args, compiled_patterns, manifest_entry)
+    os.makedirs(cli_args.profile, exist_ok=True)
+    profile_file_path = os.path.join(cli_args.profile, "{}__{}.prof".format(ws_subdir.replace(os.sep, "__"), pbix_filename[:-5]))
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(process_function, ws_subdir, pbix_filename, cli_args, compiled_patterns, manifest_entry)
+    finally:
+        profiler.dump_stats(profile_file_path)
+
+
+def process_pbix_files(pbix_workspaces_and_files, cli_args, compiled_patterns, manifest):
+    # Processing the files one at a time or spreading them across the worker processes (-j --jobs)
+    # Every result is recorded to the run journal as soon as the report is completed (see --resume)
+    processing_results = []
+    if cli_args.jobs == 1:
+        for ws_subdir, pbix_filename in pbix_workspaces_and_files:
+            processing_result = process_pbix_file_with_profiler(ws_subdir, pbix_filename, cli_args, compiled_patterns, 
+                                                                manifest.get(get_manifest_key(ws_subdir, pbix_filename)))
+            append_run_journal(processing_result)
+            processing_results.append(processing_result)
+        return processing_results
+
+    with ProcessPoolExecutor(max_workers=cli_args.jobs, initializer=init_worker,
+                             initargs=(WORK_DIR_PATH, BACKUP_GENERATION_ID)) as executor:
+        futures = [executor.submit(process_pbix_file_in_worker, ws_subdir, pbix_filename, cli_args, compiled_patterns, 
+                                   manifest.get(get_manifest_key(ws_subdir, pbix_filename)))
+                   for ws_subdir, pbix_filename in pbix_workspaces_and_files]
+        for future in futures:
+            # the journal doesn't wait for the logs, which are printed in the order of the files
+            future.add_done_callback(lambda done_future: done_future.exception() or append_run_journal(done_future.result()[0]))
+        # The results and logs are collected in the order of the files, so the output is the same as for the serial run
+        for future in futures:
+            processing_result, log = future.result()
+            uprint(log, end="")
+            processing_results.append(processing_result)
+    return processing_results
+
+
+def update_manifest(manifest, processing_results):
+    # Saving the state of the processed and skipped files. The failed files are checked again on the next run
+    for result in processing_results:
+        if "manifest_entry" in result:
+            manifest[get_manifest_key(result["workspace"], result["report"])] = result["manifest_entry"]
+    save_manifest(manifest)
+
+
+# RUN JOURNAL - RESUMING THE INTERRUPTED RUN
+def start_run_journal(run_record, resumed_results):
+    """Starting the journal of the run: the first line describes the run (the target period), every next line is
+    the processing result of the completed report (see append_run_journal).
+    The results of the resumed run are written again, so the journal covers all the completed reports"""
+    journal_temp_file_path = JOURNAL_FILE_PATH + ".tmp"
+    with open(journal_temp_file_path, "w", encoding="utf-8") as journal_file:
+        journal_file.write(json.dumps({"type": "run", "run": run_record["run"], "period": run_record["period"]}, ensure_ascii=False) + "\n")
+        for result in resumed_results:
+            journal_file.write(json.dumps(dict(result, type="report"), ensure_ascii=False) + "\n")
+    replace_file(journal_temp_file_path, JOURNAL_FILE_PATH)
+
+
+def append_run_journal(processing_result):
+    # The line is flushed to the disk right away, so the result is not lost if the run is killed after it
+    with JOURNAL_LOCK, open(JOURNAL_FILE_PATH, "a", encoding="utf-8") as journal_file:
+        journal_file.write(json.dumps(dict(processing_result, type="report"), ensure_ascii=False) + "\n")
+        journal_file.flush()
+        os.fsync(journal_file.fileno())
+
+
+def load_run_journal(run_record):
+    """Loading the results of the reports completed by the interrupted run (--resume).
+    The failed reports are processed again. The journal of the run with another target period is ignored.
+    The last line may be incomplete, if the run was killed during the write - it is ignored as well"""
+    if not os.path.exists(JOURNAL_FILE_PATH):
+        print("There is no interrupted run to resume, all the files are processed")
+        return []
+    with open(JOURNAL_FILE_PATH, "r", encoding="utf-8") as journal_file:
+        journal_records = []
+        for line in journal_file:
+            try:
+                journal_records.append(json.loads(line))
+            except ValueError:
+                break
+    if not journal_records or journal_records[0].get("period") != run_record["period"]:
+        print("The interrupted run has another target period, all the files are processed")
+        return []
+    resumed_results = {}
+    for journal_record in journal_records[1:]:
+        journal_record.pop("type")
+        if journal_record["status"] != "ERROR":
+            resumed_results[get_manifest_key(journal_record["workspace"], journal_record["report"])] = dict(journal_record, resumed=True)
+    print("Resuming the run {}: {} files are already completed".format(journal_records[0]["run"], len(resumed_results)))
+    return list(resumed_results.values())
+
+
+def remove_run_journal():
+    if os.path.exists(JOURNAL_FILE_PATH):
+        os.remove(JOURNAL_FILE_PATH)
+
+
+def init_worker(work_dir_path, backup_generation_id=None):
+    # The global path variables are not shared with the worker processes (the processes are spawned on Windows),
+    # so they are assigned again in every worker
+    with contextlib.redirect_stdout(io.StringIO()):
+        setup_work_dir_paths(work_dir_path)
+    setup_backup_generation(backup_generation_id)
+
+
+def init_watch_worker(work_dir_path, backup_generation_id=None):
+    # Ctrl+C is sent to the whole process group. The watch mode stops on it in the main process,
+    # and the files, which are already in the worker processes, must be completed, so the workers ignore it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    init_worker(work_dir_path, backup_generation_id)
+
+
+def process_pbix_file_in_worker(ws_subdir, pbix_filename, cli_args, compiled_patterns, manifest_entry):
+    # Collecting the log output per report, so the output of the parallel workers doesn't interleave.
+    # Every report has its own temp area in the #TEMP/<workspace>/<report> directory
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        processing_result = process_pbix_file_with_profiler(ws_subdir, pbix_filename, cli_args, compiled_patterns, manifest_entry)
+    return processing_result, log.getvalue()
+
+
+# SCAN (READ-ONLY MODE)
+def scan_pbix_file(ws_subdir, pbix_filename, compiled_patterns):
+    """Counting the period values in the Layout of the single .pbix file without any changes in the working directory.
+    Only the Layout member is read and decompressed. Returns the matches counts per pattern for the scan summary"""
+    _, patterns_and_new_values, _, _ = compiled_patterns
+    pbix_file_path = os.path.join(WORK_DIR_PATH, ws_subdir, pbix_filename)
+    scan_result = {"workspace": ws_subdir, "report": pbix_filename, "status": "OK", "patterns": []}
+    try:
+        literal_offsets = load_layout_index(ws_subdir, pbix_filename, compiled_patterns)
+        with ZipFile(pbix_file_path, 'r') as source_archive, source_archive.open(LAYOUT_MEMBER_NAME) as source_layout:
+            matches_counts, changes_counts, _ = replace_periods_in_stream(source_layout, None, compiled_patterns, literal_offsets)
+    except Exception as e:
+        scan_result.update(status="ERROR", error=str(e))
+        return scan_result
+    for (pattern, new_value), matches_count, changes_count in zip(patterns_and_new_values, matches_counts, changes_counts):
+        scan_result["patterns"].append({"pattern": pattern, "new_value": new_value, "matches": matches_count, "changes": changes_count})
+    return scan_result
+
+
+def scan_pbix_files(pbix_workspaces_and_files, cli_args, compiled_patterns):
+    # Scanning the files one at a time or spreading them across the worker processes (-j --jobs)
+    ws_subdirs = [ws_subdir for ws_subdir, _ in pbix_workspaces_and_files]
+    pbix_filenames = [pbix_filename for _, pbix_filename in pbix_workspaces_and_files]
+    if cli_args.jobs == 1:
+        return list(map(scan_pbix_file, ws_subdirs, pbix_filenames, [compiled_patterns] * len(ws_subdirs)))
+    with ProcessPoolExecutor(max_workers=cli_args.jobs, initializer=init_worker, initargs=(WORK_DIR_PATH,)) as executor:
+        return list(executor.map(scan_pbix_file, ws_subdirs, pbix_filenames, [compiled_patterns] * len(ws_subdirs)))
+
+
+def save_scan_results(scan_results, scan_output_path):
+    # The summary is saved as CSV (one row per report and pattern), if the file has the .csv extension, otherwise as JSON.
+    # The "-" value prints the summary to the console
+    with (contextlib.nullcontext(sys.stdout) if scan_output_path == "-"
+          else open(scan_output_path, "w", encoding="utf-8", newline="")) as scan_output_file:
+        if scan_output_path.lower().endswith(".csv"):
+            csv_writer = csv.writer(scan_output_file)
+            csv_writer.writerow(["workspace", "report", "status", "pattern", "new_value", "matches", "changes", "error"])
+            for result in scan_results:
+                for pattern_result in result["patterns"] or [{}]:
+                    csv_writer.writerow([result["workspace"], result["report"], result["status"],
+                                         pattern_result.get("pattern"), pattern_result.get("new_value"),
+                                         pattern_result.get("matches"), pattern_result.get("changes"), result.get("error")])
+        else:
+            json.dump(scan_results, scan_output_file, indent=2, ensure_ascii=False)
+            scan_output_file.write("\n")
+
+
+# WATCH MODE - PROCESSING OF THE NEW FILES
+def start_inotify():
+    """Starting the inotify monitoring of the Working Directory and all its subdirectories (except the tech directories).
+    Returns the inotify state: the file descriptor and the directories of the watch descriptors,
+    or None, if inotify is not available (not Linux) - the directories are scanned then"""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        inotify_fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)  # the same values as IN_NONBLOCK and IN_CLOEXEC
+    except (OSError, AttributeError):
+        return None
+    if inotify_fd < 0:
+        return None
+    inotify = {"libc": libc, "fd": inotify_fd, "directories": {}}
+    add_inotify_watches(inotify, WORK_DIR_PATH)
+    return inotify
+
+
+def add_inotify_watches(inotify, directory_path):
+    # Watching the directory and its subdirectories. Returns the paths of the .pbix files, which are already in them
+    pbix_file_paths = []
+    for subdirectory_path, subdirectory_names, filenames in os.walk(directory_path):
+        if subdirectory_path == WORK_DIR_PATH:
+            # the tech directories are not watched, the results are written there
+            subdirectory_names[:] = [name for name in subdirectory_names if not name.startswith("#")]
+        watch_descriptor = inotify["libc"].inotify_add_watch(inotify["fd"], os.fsencode(subdirectory_path), INOTIFY_EVENTS_MASK)
+        if watch_descriptor >= 0:
+            inotify["directories"][watch_descriptor] = subdirectory_path
+        pbix_file_paths.extend(os.path.join(subdirectory_path, filename) for filename in filenames if filename[-5:] == ".pbix")
+    return pbix_file_paths
+
+
+def read_inotify_events(inotify, timeout):
+    """Waiting for the inotify events up to the timeout (seconds).
+    Returns the paths of the created and changed .pbix files and the flag, if the events were lost (queue overflow)
+    and the directories should be scanned"""
+    ready_fds, _, _ = select.select([inotify["fd"]], [], [], timeout)
+    if not ready_fds:
+        return [], False
+    try:
+        data = os.read(inotify["fd"], 64 * 1024)
+    except BlockingIOError:
+        return [], False
+    pbix_file_paths, events_lost = [], False
+    offset = 0
+    while offset < len(data):
+        # struct inotify_event: int wd, uint32 mask, uint32 cookie, uint32 len, char name[len]
+        watch_descriptor, mask, _, name_length = struct.unpack_from("iIII", data, offset)
+        name = os.fsdecode(data[offset + 16:offset + 16 + name_length].rstrip(b"\0"))
+        offset += 16 + name_length
+        if mask & INOTIFY_QUEUE_OVERFLOW:
+            events_lost = True
+            continue
+        directory_path = inotify["directories"].get(watch_descriptor)
+        if directory_path is None or not name:
+            continue
+        if mask & INOTIFY_IS_DIR:
+            if directory_path != WORK_DIR_PATH or not name.startswith("#"):
+                # the files may be written to the new directory before its watch is added, so they are checked right away
+                pbix_file_paths.extend(add_inotify_watches(inotify, os.path.join(directory_path, name)))
+        elif name[-5:] == ".pbix":
+            pbix_file_paths.append(os.path.join(directory_path, name))
+    return pbix_file_paths, events_lost
+
+
+def get_file_signature(pbix_file_path):
+    # The size and the modification time of the file, None if the file doesn't exist (anymore)
+    try:
+        file_stat = os.stat(pbix_file_path)
+    except FileNotFoundError:
+        return None
+    return file_stat.st_size, file_stat.st_mtime_ns
+
+
+def watch_pbix_files(pbix_workspaces_and_files, cli_args, compiled_patterns, manifest, backup_generation_id):
+    """Watch mode (--watch): processing the .pbix files as soon as they are completely written to the workspace folders.
+    The file is complete, when its size and modification time didn't change for the debounce time and it's a valid zip archive
+    (the broken file is processed anyway after the 4 debounce times and is moved to the #ERRORS).
+    The files, which are found at the start, are checked first (the updated ones are skipped by the manifest).
+    The results of the script (the replaced source files) are not processed again: their signatures are remembered.
+    Every processed file is saved to the manifest and the backup generation right away.
+    Returns the processing results of all the processed files"""
+    print("\nWATCHING THE WORKSPACE FOLDERS FOR THE NEW .PBIX FILES (Ctrl+C to stop)")
+    selected_files = set(pbix_workspaces_and_files) if cli_args.workspace else None
+    inotify = start_inotify()
+    print("Monitoring: {}".format("inotify" if inotify else "scan every {}s".format(WATCH_POLL_INTERVAL)))
+
+    pending_files = dict.fromkeys(pbix_workspaces_and_files)  # (workspace, report) -> (signature, unchanged since) or None
+    known_signatures = {}  # the signatures of the last directories scan (no inotify)
+    processed_signatures = {}  # the signatures of the files after the processing
+    processing_futures = {}  # the files processed by the worker processes (-j --jobs)
+    processing_results = []
+    last_activity_time = time.monotonic()
+    executor = (ProcessPoolExecutor(max_workers=cli_args.jobs, initializer=init_watch_worker,
+                                    initargs=(WORK_DIR_PATH, BACKUP_GENERATION_ID))
+                if cli_args.jobs > 1 else None)
+
+    def get_error_result(pbix_file_key, error):
+        # The file, which failed outside of its processing (for example, the worker process crashed), is recorded as the error
+        print("Error with {}: {!r}".format(pbix_file_key[1], error))
+        return {"workspace": pbix_file_key[0], "report": pbix_file_key[1], "status": "ERROR", "error": repr(error)}
+
+    def finish_file(processing_result):
+        pbix_file_key = (processing_result["workspace"], processing_result["report"])
+        processed_signatures[pbix_file_key] = get_file_signature(os.path.join(WORK_DIR_PATH, *pbix_file_key))
+        processing_results.append(processing_result)
+        if not cli_args.periods:
+            update_manifest(manifest, [processing_result])
+        save_backup_generation(backup_generation_id, [processing_result])
+
+    try:
+        while True:
+            # Collecting the new and changed files
+            if inotify:
+                changed_file_paths, events_lost = read_inotify_events(inotify, min(cli_args.debounce, 1))
+                changed_files = [(shorten_dir_path(os.path.dirname(path)), os.path.basename(path)) for path in changed_file_paths]
+                if events_lost:
+                    changed_files.extend(get_pbix_workspaces_and_filenames(cli_args.include, cli_args.exclude, save_cache=False))
+            else:
+                time.sleep(WATCH_POLL_INTERVAL)
+                current_signatures = {pbix_file_key: get_file_signature(os.path.join(WORK_DIR_PATH, *pbix_file_key))
+                                      for pbix_file_key in get_pbix_workspaces_and_filenames(cli_args.include, cli_args.exclude,
+                                                                                             save_cache=False)}
+                changed_files = [pbix_file_key for pbix_file_key, signature in current_signatures.items()
+                                 if known_signatures.get(pbix_file_key) != signature]
+                known_signatures = current_signatures
+            for pbix_file_key in changed_files:
+                if selected_files is not None and pbix_file_key not in selected_files:
+                    continue
+                if selected_files is None and not is_report_selected(*pbix_file_key, cli_args.include, cli_args.exclude):
+                    continue
+                pending_files.setdefault(pbix_file_key, None)
+
+            # Selecting the completely written files
+            now = time.monotonic()
+            ready_files = []
+            for pbix_file_key, pending_state in list(pending_files.items()):
+                if pbix_file_key in processing_futures:
+                    continue  # the file is checked again after its current processing
+                signature = get_file_signature(os.path.join(WORK_DIR_PATH, *pbix_file_key))
+                if signature is None or signature == processed_signatures.get(pbix_file_key):
+                    del pending_files[pbix_file_key]
+                elif pending_state is None or pending_state[0] != signature:
+                    pending_files[pbix_file_key] = (signature, now)
+                elif now - pending_state[1] >= cli_args.debounce and (
+                        zipfile.is_zipfile(os.path.join(WORK_DIR_PATH, *pbix_file_key)) 
+                        or now - pending_state[1] >= cli_args.debounce * 4):
+                    del pending_files[pbix_file_key]
+                    ready_files.append(pbix_file_key)
+
+            # Processing the files
+            for ws_subdir, pbix_filename in ready_files:
+                for tech_dir in (TEMP_DIR_PATH, ERRORS_DIR_PATH):
+                    os.makedirs(os.path.join(tech_dir, ws_subdir), exist_ok=True)  # the workspace may be new
+                manifest_entry = manifest.get(get_manifest_key(ws_subdir, pbix_filename))
+                if executor is None:
+                    try:
+                        processing_result = process_pbix_file_with_profiler(ws_subdir, pbix_filename, cli_args, compiled_patterns,
+                                                                            manifest_entry)
+                    except Exception as e:
+                        processing_result = get_error_result((ws_subdir, pbix_filename), e)
+                    finish_file(processing_result)
+                else:
+                    processing_futures[(ws_subdir, pbix_filename)] = executor.submit(
+                        process_pbix_file_in_worker, ws_subdir, pbix_filename, cli_args, compiled_patterns, manifest_entry)
+            for pbix_file_key, future in list(processing_futures.items()):
+                if future.done():
+                    del processing_futures[pbix_file_key]
+                    try:
+                        processing_result, log = future.result()
+                    except Exception as e:
+                        processing_result, log = get_error_result(pbix_file_key, e), ""
+                    uprint(log, end="")
+                    finish_file(processing_result)
+
+            if pending_files or processing_futures:
+                last_activity_time = now
+            elif cli_args.idleExit is not None and now - last_activity_time >= cli_args.idleExit:
+                print("\nNo new files for {}s, stopped watching".format(cli_args.idleExit))
+                break
+    except KeyboardInterrupt:
+        print("\nStopped watching")
+    finally:
+        if executor is not None:
+            # the files, which are already in the worker processes, are completed
+            for pbix_file_key, future in processing_futures.items():
+                try:
+                    processing_result, log = future.result()
+                except BaseException as e:
+                    processing_result, log = get_error_result(pbix_file_key, e), ""
+                uprint(log, end="")
+                finish_file(processing_result)
+            executor.shutdown()
+        if inotify:
+            os.close(inotify["fd"])
+        # the folders are scanned without saving the discovery cache while watching, it's saved once at the end
+        get_pbix_workspaces_and_filenames(cli_args.include, cli_args.exclude)
+    return processing_results
 
 
 """OUTPUT FUNCTIONS (STDOUT)"""
@@ -343,15 +1911,63 @@ def print_patterns(patterns_and_new_values):
         uprint("{}  ->  {}".format(period_pattern, period_new_value))
 
 
+def print_matches_counts(compiled_patterns, matches_counts):
+    _, patterns_and_new_values, _, _ = compiled_patterns
+    for (pattern, new_value), matches_count in zip(patterns_and_new_values, matches_counts):
+        uprint("\t{} -> {}: {} matches".format(pattern, new_value, matches_count))
+
+
+def print_scan_summary(scan_results):
+    print("\n------------\nSCAN SUMMARY\n------------")
+    for result in scan_results:
+        if result["status"] == "ERROR":
+            uprint(" * {}\\{}: ERROR {}".format(result["workspace"], result["report"], result["error"]))
+        else:
+            uprint(" * {}\\{}: {} matches, {} changes".format(
+                result["workspace"], result["report"],
+                sum(pattern_result["matches"] for pattern_result in result["patterns"]),
+                sum(pattern_result["changes"] for pattern_result in result["patterns"])))
+    print("Reports to be changed: {}".format(
+        len([result for result in scan_results 
+             if any(pattern_result["changes"] for pattern_result in result["patterns"])])))
+
+
 def print_file_name(ws_subdir, pbix_filename):
     print("--------------------")
     print("WORKSPACE", ws_subdir, ": FILE", pbix_filename)
 
 
+def print_processing_summary(processing_results):
+    failed_results = [result for result in processing_results if result["status"] == "ERROR"]
+    print("\n------------------\nPROCESSING SUMMARY\n------------------")
+    print("Processed files: {}".format(len(processing_results)))
+    print("Skipped files (no changes needed): {}".format(
+        len([result for result in processing_results if result["status"] == "SKIPPED"])))
+    resumed_results_count = len([result for result in processing_results if result.get("resumed")])
+    if resumed_results_count:
+        print("Resumed files (completed by the interrupted run): {}".format(resumed_results_count))
+    print("Files with errors: {}".format(len(failed_results)))
+    for result in failed_results:
+        uprint(" * {}\\{}: {}".format(result["workspace"], result["report"], result["error"]))
+    print_stage_timings(processing_results)
+
+
+def print_stage_timings(processing_results):
+    stage_seconds = {}
+    for result in processing_results:
+        for stage_record in result.get("stages", []):
+            stage_seconds[stage_record["stage"]] = stage_seconds.get(stage_record["stage"], 0) + stage_record["seconds"]
+    print("Time per stage (all files):")
+    for stage_name, seconds in stage_seconds.items():
+        print(" * {}: {:.3f}s".format(stage_name, seconds))
+
+
 # The function that replaces non-UTF-8 symbols with codes (for PowerShell)
-def uprint(*objects, sep=' ', end='\n', file=sys.stdout):
-    enc = file.encoding
-    if enc == 'UTF-8':
+def uprint(*objects, sep=' ', end='\n', file=None):
+    # sys.stdout is resolved on every call, so the output may be redirected (see process_pbix_file_in_worker)
+    file = file if file else sys.stdout
+    enc = getattr(file, 'encoding', None)
+    if enc is None or enc == 'UTF-8':
         print(*objects, sep=sep, end=end, file=file)
     else:
         f = lambda obj: str(obj).encode(enc, errors='backslashreplace').decode(enc)
@@ -367,8 +1983,18 @@ def main():
     verify_cli_args(cli_parser)
 
     # Generating patterns and new values
-    patterns_and_new_values = get_patterns_and_replacements(cli_args.year, cli_args.month, cli_args.oldYearValue)
-    print_patterns(patterns_and_new_values)
+    if cli_args.periods:
+        # Batch mode: the list of (period label, compiled patterns) with the patterns of every target period
+        compiled_patterns = []
+        for period in get_batch_periods(cli_args.periods):
+            patterns_and_new_values = get_patterns_and_replacements(period.year, period.month, cli_args.oldYearValue)
+            print("\nPERIOD {}".format(format_period(period)), end="")
+            print_patterns(patterns_and_new_values)
+            compiled_patterns.append((format_period(period), compile_period_patterns(patterns_and_new_values)))
+    else:
+        patterns_and_new_values = get_patterns_and_replacements(cli_args.year, cli_args.month, cli_args.oldYearValue)
+        print_patterns(patterns_and_new_values)
+        compiled_patterns = compile_period_patterns(patterns_and_new_values)
 
     # Creating the path strings for main directories: Working (root), #ORIGINALS BACKUP, #TEMP
     setup_work_dir_paths(cli_args.directory)
@@ -383,52 +2009,69 @@ def main():
     else:
         # if the nothing was passed to the --workspace and --report args
         # the script searches the directory for available .pbix reports and their workspaces
-        pbix_workspaces_and_files = get_pbix_workspaces_and_filenames()
+        # The discovery cache is not saved in the scan mode, which doesn't write anything to the working directory
+        pbix_workspaces_and_files = get_pbix_workspaces_and_filenames(cli_args.include, cli_args.exclude, save_cache=not cli_args.scan)
+
+    # The restore mode copies the files from the backup store back to the workspace directories
+    if cli_args.restore:
+        restore_backup_files(cli_args.restore, pbix_workspaces_and_files if cli_args.workspace else None)
+        return
+
+    # The scan mode only reads the Layout files and doesn't create or change anything in the working directory
+    if cli_args.scan:
+        print("\nTotal number of .pbix files found in Working Directory: {}".format(len(pbix_workspaces_and_files)))
+        print("\nFILES SCAN")
+        scan_results = scan_pbix_files(pbix_workspaces_and_files, cli_args, compiled_patterns)
+        print_scan_summary(scan_results)
+        save_scan_results(scan_results, cli_args.scan)
+        return
 
     pbix_workpaces = set([pbix[0] for pbix in pbix_workspaces_and_files])
     create_directories_hierarchy(pbix_workpaces)
 
     # Stopping the script execution if no .pbix files were found in wroking directory
     print("\nTotal number of .pbix files found in Working Directory: {}".format(len(pbix_workspaces_and_files)))
-    if len(pbix_workspaces_and_files) == 0:
+    if len(pbix_workspaces_and_files) == 0 and not cli_args.watch:
         return
     
     # Processing of the .pbix files
     print("\nFILES PROCESSING")
-    for ws_subdir, pbix_filename in pbix_workspaces_and_files:
-        print_file_name(ws_subdir, pbix_filename)
-
-        # Paths to src and backup files, temp directory. Source file will be replaced by the Result file in root directory
-        pbix_file_path = os.path.join(WORK_DIR_PATH, ws_subdir, pbix_filename)
-        pbix_backup_file_path = os.path.join(ORIGINALS_DIR_PATH, ws_subdir, pbix_filename)
-        pbix_temp_files_path = os.path.join(TEMP_DIR_PATH, ws_subdir, pbix_filename[:-5])
-        pbix_error_file_path = os.path.join(ERRORS_DIR_PATH, ws_subdir, pbix_filename)
+    manifest = load_manifest()
+    backup_generation_id = datetime.datetime.now().strftime("%Y-%m-%d %H-%M-%S")
+    setup_backup_generation(backup_generation_id)
+    run_record = {"run": datetime.datetime.now().isoformat(timespec="seconds"), 
+                  "period": format_period(get_new_period(cli_args.year, cli_args.month)),
+                  "mode": "stream" if cli_args.stream else "extract", "jobs": cli_args.jobs}
+    if cli_args.periods:
+        run_record.update(period=[period_label for period_label, _ in compiled_patterns], mode="batch")
+    start_time = time.perf_counter()
+    if cli_args.watch:
+        # The watch mode saves every processed file to the manifest right away, so the journal is not needed
+        run_record.update(mode="watch")
+        processing_results = watch_pbix_files(pbix_workspaces_and_files, cli_args, compiled_patterns, manifest, backup_generation_id)
+    else:
+        resumed_results = load_run_journal(run_record) if cli_args.resume else []
+        resumed_keys = set(get_manifest_key(result["workspace"], result["report"]) for result in resumed_results)
+        pbix_workspaces_and_files = [(ws_subdir, pbix_filename) for ws_subdir, pbix_filename in pbix_workspaces_and_files
+                                     if get_manifest_key(ws_subdir, pbix_filename) not in resumed_keys]
+        start_run_journal(run_record, resumed_results)
+        processing_results = resumed_results + process_pbix_files(pbix_workspaces_and_files, cli_args, compiled_patterns, manifest)
+    run_record.update(seconds=round(time.perf_counter() - start_time, 6), files=len(processing_results),
+                      errors=len([result for result in processing_results if result["status"] == "ERROR"]),
+                      skipped=len([result for result in processing_results if result["status"] == "SKIPPED"]))
+    if not cli_args.periods:
+        update_manifest(manifest, processing_results)  # the source files aren't changed in the batch mode
+    save_backup_generation(backup_generation_id, processing_results)
+    remove_pending_backup_records(backup_generation_id)  # all the pending records are in the generation file now
+    prune_backup_generations(cli_args.keepBackups)
+    remove_run_journal()  # the run is completed, the manifest and the backup generation contain all the results
+    print_processing_summary(processing_results)
+    if cli_args.runReport:
+        save_run_report(cli_args.runReport, run_record, processing_results)
 
-        # Creating the file backup - moving the original file to the #ORIGINALS BACKUP
-        backup_original_file(pbix_file_path, pbix_backup_file_path)
-        
-        # Processing of the selected file
-        try:
-            unzip_pbix(pbix_file_path, pbix_temp_files_path)  # unzipping from root/#ORIGINALS BACKUP to root/#TEMP
-            remove_security_bindings_data(pbix_temp_files_path)  # removing check sum data
-            modify_layout_file(pbix_temp_files_path, patterns_and_new_values)  # replacing the slicers values
-            zip_pbix(pbix_temp_files_path, pbix_file_path)  # zipping file from root/#TEMP to root
-
-        # If there are any errors, the original file is copied to the # ERRORS folder
-        except zipfile.BadZipFile as bad_zip_exception:
-            copy_error_file(pbix_backup_file_path, pbix_error_file_path)
-            print("Invalid zip file: " + pbix_filename)
-            print(str(bad_zip_exception))
-        except Exception as e:
-            copy_error_file(pbix_backup_file_path, pbix_error_file_path)
-            print("Error with " + pbix_filename)
-            print(str(e))
-
-            
-    
     remove_temp_files()
     print("\n----\nDONE\n----")
-    print("Please, check the {} folder for result files\n".format(WORK_DIR_PATH))
+    print("Please, check the {} folder for result files\n".format(RESULTS_DIR_PATH if cli_args.periods else WORK_DIR_PATH))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,319 @@
+"""Export, update and import of the PBI reports as one concurrent pipeline (the Python version of Export_Import_pbix.ps1).
+
+Every report of the selected workspaces is downloaded from the service to the dated folder, updated with the
+bookmarks_update functions (called directly, without the separate script run) and uploaded back to the service.
+The stages of different reports overlap: while one report is updated, the next ones are downloaded
+and the previous ones are uploaded, so the run takes about as long as its slowest stage.
+The number of the reports in the pipeline is bounded, the downloads and uploads are retried on errors.
+
+The service is accessed through the transport:
+- local - the folder-based stand-in for the service: the subfolders are the workspaces with the .pbix reports.
+  The updated reports overwrite the reports in the folder. Useful for the tests and the dry runs.
+- powershell - the MicrosoftPowerBIMgmt cmdlets (Get-PowerBIReport, Export-PowerBIReport, New-PowerBIReport),
+  run with PowerShell. Every call runs a separate PowerShell process, so the login command (--connectCommand)
+  must be non-interactive, for example Connect-PowerBIServiceAccount with the service principal.
+
+All the arguments, which are not listed below, are passed to the updater (see bookmarks_update.py -h), for example:
+    python export_import.py --transport local --serviceDir "C:\\PBI Service" --workspace "Sales" --outputDir Backups -y 2024 -m 1 -s
+"""
+import argparse
+import datetime
+import fnmatch
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import bookmarks_update
+
+
+DEFAULT_DOWNLOADS = 4  # The number of the reports downloaded at the same time
+DEFAULT_UPLOADS = 4  # The number of the reports uploaded at the same time
+DEFAULT_RETRIES = 3  # The number of the download and upload attempts of every report
+DEFAULT_RETRY_DELAY = 5  # Seconds before the second attempt, the delay is doubled for every next attempt
+DEFAULT_SKIP_REPORTS = ["*Usage Metrics*"]  # The reports created by the service, they are never updated
+PRINT_LOCK = threading.Lock()  # The lines and the log blocks of the parallel reports are printed one at a time
+
+
+"""TRANSPORTS"""
+class LocalFolderTransport:
+    """The folder-based stand-in for the PBI Service: <service directory>/<workspace>/<report>.pbix.
+    The report id is the report name"""
+    def __init__(self, service_dir_path):
+        self.service_dir_path = service_dir_path
+
+    def list_reports(self, workspace_name):
+        # Returns the list of the (report id, report name) pairs
+        workspace_dir_path = os.path.join(self.service_dir_path, workspace_name)
+        return [(filename[:-5], filename[:-5]) for filename in sorted(os.listdir(workspace_dir_path)) if filename[-5:] == ".pbix"]
+
+    def download_report(self, workspace_name, report_id, output_file_path):
+        shutil.copyfile(os.path.join(self.service_dir_path, workspace_name, report_id + ".pbix"), output_file_path)
+
+    def upload_report(self, workspace_name, report_name, pbix_file_path):
+        # The report is replaced by the rename, so the service folder never contains the half-copied report
+        service_file_path = os.path.join(self.service_dir_path, workspace_name, report_name + ".pbix")
+        temp_file_path = "{}.{}.tmp".format(service_file_path, threading.get_ident())
+        shutil.copyfile(pbix_file_path, temp_file_path)
+        os.replace(temp_file_path, service_file_path)
+
+
+class PowerShellTransport:
+    """The PBI Service access with the MicrosoftPowerBIMgmt module cmdlets - the same as in the Export_Import_pbix.ps1.
+    The workspace ids are taken once, when the reports of the workspace are listed"""
+    def __init__(self, powershell="pwsh", connect_command=None):
+        self.powershell = powershell
+        self.connect_command = connect_command
+        self.workspace_ids = {}
+
+    def run_command(self, command):
+        script = "$ErrorActionPreference = 'Stop'\n{}\n{}".format(self.connect_command or "", command)
+        completed_process = subprocess.run([self.powershell, "-NoProfile", "-NonInteractive", "-Command", script],
+                                           capture_output=True, text=True)
+        if completed_process.returncode != 0:
+            raise RuntimeError("PowerShell command failed: {}".format(completed_process.stderr.strip()))
+        return completed_process.stdout
+
+    def list_reports(self, workspace_name):
+        output = self.run_command(
+            "$Workspace = (Get-PowerBIWorkspace -Name {})[0]\n"
+            "Write-Output $Workspace.Id.ToString()\n"
+            "Get-PowerBIReport -WorkspaceId $Workspace.Id | ForEach-Object {{ Write-Output ($_.Id.ToString() + \"`t\" + $_.Name) }}"
+            .format(quote_powershell(workspace_name)))
+        lines = [line for line in output.splitlines() if line.strip()]
+        self.workspace_ids[workspace_name] = lines[0].strip()
+        return [tuple(line.split("\t", 1)) for line in lines[1:]]
+
+    def download_report(self, workspace_name, report_id, output_file_path):
+        # Export-PowerBIReport fails, if the file exists
+        if os.path.exists(output_file_path):
+            os.remove(output_file_path)
+        self.run_command("Export-PowerBIReport -WorkspaceId {} -Id {} -OutFile {}".format(
+            quote_powershell(self.workspace_ids[workspace_name]), quote_powershell(report_id), quote_powershell(output_file_path)))
+
+    def upload_report(self, workspace_name, report_name, pbix_file_path):
+        # New-PowerBIReport takes the report name from the file name (the Name parameter doesn't accept the dots)
+        self.run_command("New-PowerBIReport -Path {} -WorkspaceId {} -ConflictAction CreateOrOverwrite".format(
+            quote_powershell(pbix_file_path), quote_powershell(self.workspace_ids[workspace_name])))
+
+
+def quote_powershell(value):
+    # The single-quoted PowerShell string: the quotes inside are doubled
+    return "'{}'".format(str(value).replace("'", "''"))
+
+
+def create_transport(cli_args):
+    if cli_args.transport == "local":
+        return LocalFolderTransport(cli_args.serviceDir)
+    return PowerShellTransport(cli_args.powershell, cli_args.connectCommand)
+
+
+"""PIPELINE"""
+def call_with_retries(function, args, retries, retry_delay, description):
+    # Calling the transport function again after the growing delay, if it fails. The last error is raised
+    for attempt in range(1, retries + 1):
+        try:
+            return function(*args)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            print_line("{} failed (attempt {} of {}): {}. Retrying in {}s".format(description, attempt, retries, e, retry_delay))
+            time.sleep(retry_delay)
+            retry_delay *= 2
+
+
+def process_report(transport, ws_name, report_id, report_name, pipeline):
+    """Downloading, updating and uploading of the single report.
+    The downloads and uploads are limited by the pipeline semaphores, the updates - by the size of the updater process pool.
+    Only the updated reports are uploaded: the skipped reports (no changes needed) and the failed ones are left in the service.
+    Returns the processing result of the updater with the download and upload details"""
+    pbix_filename = report_name + ".pbix"
+    report_description = "{}\\{}".format(ws_name, pbix_filename)
+    pbix_file_path = os.path.join(bookmarks_update.WORK_DIR_PATH, ws_name, pbix_filename)
+    pipeline_result = {"workspace": ws_name, "report": pbix_filename, "status": "ERROR", "uploaded": False}
+    start_time = time.perf_counter()
+    try:
+        with pipeline["download_slots"]:
+            download_start_time = time.perf_counter()
+            call_with_retries(transport.download_report, (ws_name, report_id, pbix_file_path),
+                              pipeline["retries"], pipeline["retry_delay"], "Downloading " + report_description)
+            pipeline_result["download_seconds"] = round(time.perf_counter() - download_start_time, 6)
+        print_line("Downloaded {}".format(report_description))
+
+        processing_result, log = pipeline["update_executor"].submit(
+            bookmarks_update.process_pbix_file_in_worker, ws_name, pbix_filename, pipeline["cli_args"],
+            pipeline["compiled_patterns"], None).result()
+        print_line(log, end="")
+        pipeline_result.update(processing_result)
+        if processing_result["status"] != "OK":
+            return pipeline_result
+
+        with pipeline["upload_slots"]:
+            upload_start_time = time.perf_counter()
+            call_with_retries(transport.upload_report, (ws_name, report_name, pbix_file_path),
+                              pipeline["retries"], pipeline["retry_delay"], "Uploading " + report_description)
+            pipeline_result.update(uploaded=True, upload_seconds=round(time.perf_counter() - upload_start_time, 6))
+        print_line("Uploaded {}".format(report_description))
+    except Exception as e:
+        print_line("Error with {}: {}".format(report_description, e))
+        pipeline_result.update(status="ERROR", error=str(e))
+    finally:
+        pipeline_result["pipeline_seconds"] = round(time.perf_counter() - start_time, 6)
+    return pipeline_result
+
+
+def run_pipeline(transport, workspaces_and_reports, cli_args, updater_cli_args, compiled_patterns):
+    """Running the reports through the download -> update -> upload pipeline.
+    Every report is handled by its own thread from the pool, which size is the total size of all the stages,
+    so there are never more reports in the pipeline (and on the disk) than the stages can process at the same time"""
+    pipeline = {
+        "download_slots": threading.BoundedSemaphore(cli_args.downloads),
+        "upload_slots": threading.BoundedSemaphore(cli_args.uploads),
+        "retries": cli_args.retries,
+        "retry_delay": cli_args.retryDelay,
+        "cli_args": updater_cli_args,
+        "compiled_patterns": compiled_patterns,
+    }
+    reports_threads_count = cli_args.downloads + updater_cli_args.jobs + cli_args.uploads
+    with ProcessPoolExecutor(max_workers=updater_cli_args.jobs, initializer=bookmarks_update.init_worker,
+                             initargs=(bookmarks_update.WORK_DIR_PATH, bookmarks_update.BACKUP_GENERATION_ID)) as update_executor, \
+            ThreadPoolExecutor(max_workers=reports_threads_count) as reports_executor:
+        pipeline["update_executor"] = update_executor
+        futures = [reports_executor.submit(process_report, transport, ws_name, report_id, report_name, pipeline)
+                   for ws_name, report_id, report_name in workspaces_and_reports]
+        return [future.result() for future in futures]
+
+
+def get_workspaces_and_reports(transport, workspace_names, skip_report_patterns):
+    # Returns the list of the (workspace name, report id, report name) of all the reports to update
+    workspaces_and_reports = []
+    for ws_name in workspace_names:
+        reports = transport.list_reports(ws_name)
+        print("There are {} reports in the [{}] workspace.".format(len(reports), ws_name))
+        for report_id, report_name in reports:
+            if any(fnmatch.fnmatch(report_name, pattern) for pattern in skip_report_patterns):
+                bookmarks_update.uprint("* {} [Skipped]".format(report_name))
+                continue
+            bookmarks_update.uprint("* {}".format(report_name))
+            workspaces_and_reports.append((ws_name, report_id, report_name))
+    return workspaces_and_reports
+
+
+"""OUTPUT FUNCTIONS (STDOUT)"""
+def print_line(*objects, end="\n"):
+    with PRINT_LOCK:
+        bookmarks_update.uprint(*objects, end=end)
+
+
+def print_pipeline_summary(pipeline_results):
+    print("\n----------------\nPIPELINE SUMMARY\n----------------")
+    print("Reports: {}".format(len(pipeline_results)))
+    print("Uploaded reports: {}".format(len([result for result in pipeline_results if result["uploaded"]])))
+    print("Skipped reports (no changes needed): {}".format(
+        len([result for result in pipeline_results if result["status"] == "SKIPPED"])))
+    failed_results = [result for result in pipeline_results if result["status"] == "ERROR"]
+    print("Reports with errors: {}".format(len(failed_results)))
+    for result in failed_results:
+        bookmarks_update.uprint(" * {}\\{}: {}".format(result["workspace"], result["report"], result.get("error")))
+    for stage_name in ("download", "upload"):
+        print("Time of the {} stage (all reports): {:.3f}s".format(
+            stage_name, sum(result.get(stage_name + "_seconds", 0) for result in pipeline_results)))
+    bookmarks_update.print_stage_timings(pipeline_results)
+
+
+"""CLI"""
+def get_cli_parser():
+    parser = argparse.ArgumentParser(
+        description="Export, update and import of the PBI reports as one concurrent pipeline. "
+                    "All the other arguments are passed to the updater (see bookmarks_update.py -h)")
+    parser.add_argument("--transport", choices=["local", "powershell"], default="powershell", help="The PBI Service access")
+    parser.add_argument("--serviceDir", type=str, help="The service folder of the local transport (<workspace>/<report>.pbix)")
+    parser.add_argument("--powershell", type=str, default="pwsh", help="The PowerShell executable of the powershell transport")
+    parser.add_argument("--connectCommand", type=str, help="The non-interactive login command, run before every cmdlet "
+                        "(required for the powershell transport)")
+    parser.add_argument("--workspace", type=str, action="append", required=True, help="The workspace to update (repeatable)")
+    parser.add_argument("--skipReports", type=str, action="append", help="Glob pattern of the report names to skip (repeatable). "
+                        "Default: *Usage Metrics*")
+    parser.add_argument("--outputDir", type=str, default=os.getcwd(), help="The folder for the dated folders with the downloaded reports")
+    parser.add_argument("--downloads", type=int, default=DEFAULT_DOWNLOADS, help="Number of the parallel downloads")
+    parser.add_argument("--uploads", type=int, default=DEFAULT_UPLOADS, help="Number of the parallel uploads")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES, help="Number of the download and upload attempts")
+    parser.add_argument("--retryDelay", type=float, default=DEFAULT_RETRY_DELAY, help="Seconds before the second attempt")
+    return parser
+
+
+def parse_cli_args():
+    cli_parser = get_cli_parser()
+    cli_args, updater_args = cli_parser.parse_known_args()
+    if cli_args.transport == "local" and not cli_args.serviceDir:
+        cli_parser.error("--serviceDir is required for the local transport")
+    if cli_args.transport == "powershell" and not cli_args.connectCommand:
+        # every cmdlet runs in its own PowerShell process, which is not logged in without the command
+        cli_parser.error("--connectCommand is required for the powershell transport")
+    if min(cli_args.downloads, cli_args.uploads, cli_args.retries) < 1:
+        cli_parser.error("--downloads, --uploads and --retries should be 1 or more")
+
+    # The working directory and the reports are set by the pipeline, the updater must replace the downloaded files
+    updater_cli_parser = bookmarks_update.get_cli_parser()
+    updater_cli_args = updater_cli_parser.parse_args(updater_args)
+    if any((updater_cli_args.directory, updater_cli_args.workspace, updater_cli_args.report, updater_cli_args.periods,
+            updater_cli_args.scan, updater_cli_args.restore, updater_cli_args.resume, updater_cli_args.watch,
+            updater_cli_args.idleExit is not None, updater_cli_args.debounce != bookmarks_update.DEFAULT_WATCH_DEBOUNCE)):
+        cli_parser.error("The updater arguments -d, -w, -r, -P, --scan, --restore, --resume, --watch, --debounce and --idleExit "
+                         "can't be used in the pipeline")
+    if updater_cli_args.jobs < 1:
+        cli_parser.error("-j --jobs should be 1 or more")
+    return cli_args, updater_cli_args
+
+
+"""MAIN FUNCTION"""
+def main():
+    cli_args, updater_cli_args = parse_cli_args()
+
+    patterns_and_new_values = bookmarks_update.get_patterns_and_replacements(
+        updater_cli_args.year, updater_cli_args.month, updater_cli_args.oldYearValue)
+    bookmarks_update.print_patterns(patterns_and_new_values)
+    compiled_patterns = bookmarks_update.compile_period_patterns(patterns_and_new_values)
+
+    # The reports are downloaded to the dated folder, which is the working directory of the updater
+    output_dir_path = os.path.join(os.path.abspath(cli_args.outputDir), datetime.datetime.now().strftime("%Y%m%d-%H%M"))
+    for ws_name in cli_args.workspace:
+        os.makedirs(os.path.join(output_dir_path, ws_name), exist_ok=True)
+    bookmarks_update.setup_work_dir_paths(output_dir_path)
+    backup_generation_id = datetime.datetime.now().strftime("%Y-%m-%d %H-%M-%S")
+    bookmarks_update.setup_backup_generation(backup_generation_id)
+    bookmarks_update.create_directories_hierarchy(cli_args.workspace)
+
+    print("\nDEFINING THE REPORTS TO UPDATE")
+    transport = create_transport(cli_args)
+    workspaces_and_reports = get_workspaces_and_reports(
+        transport, cli_args.workspace, cli_args.skipReports if cli_args.skipReports else DEFAULT_SKIP_REPORTS)
+
+    print("\nPIPELINE: DOWNLOAD -> UPDATE -> UPLOAD")
+    run_record = {"run": datetime.datetime.now().isoformat(timespec="seconds"),
+                  "period": bookmarks_update.format_period(bookmarks_update.get_new_period(updater_cli_args.year, updater_cli_args.month)),
+                  "mode": "pipeline", "jobs": updater_cli_args.jobs, "downloads": cli_args.downloads, "uploads": cli_args.uploads}
+    start_time = time.perf_counter()
+    pipeline_results = run_pipeline(transport, workspaces_and_reports, cli_args, updater_cli_args, compiled_patterns)
+    run_record.update(seconds=round(time.perf_counter() - start_time, 6), files=len(pipeline_results),
+                      errors=len([result for result in pipeline_results if result["status"] == "ERROR"]),
+                      skipped=len([result for result in pipeline_results if result["status"] == "SKIPPED"]))
+    print("\nPipeline time: {:.3f}s".format(run_record["seconds"]))
+
+    # The state of the updated reports is saved in the same way as by the updater's own run
+    bookmarks_update.update_manifest(bookmarks_update.load_manifest(), pipeline_results)
+    bookmarks_update.save_backup_generation(backup_generation_id, pipeline_results)
+    bookmarks_update.remove_pending_backup_records(backup_generation_id)
+    bookmarks_update.prune_backup_generations(updater_cli_args.keepBackups)
+    print_pipeline_summary(pipeline_results)
+    if updater_cli_args.runReport:
+        bookmarks_update.save_run_report(updater_cli_args.runReport, run_record, pipeline_results)
+    bookmarks_update.remove_temp_files()
+    print("\n----\nDONE\n----")
+
+
+if __name__ == "__main__":
+    main()
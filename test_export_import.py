@@ -0,0 +1,97 @@
+"""Tests of the export -> update -> import pipeline with the local folder transport.
+
+Run with: python -m pytest test_export_import.py (or python -m unittest test_export_import)
+"""
+import argparse
+import os
+import tempfile
+import unittest
+
+import benchmark
+import bookmarks_update
+import export_import
+
+
+class RecordingLocalFolderTransport(export_import.LocalFolderTransport):
+    """The local transport, which records the downloads and uploads. The first download of every report fails"""
+    def __init__(self, service_dir_path, failing_downloads=False):
+        super().__init__(service_dir_path)
+        self.failing_downloads = failing_downloads
+        self.downloads = []
+        self.uploads = []
+
+    def download_report(self, workspace_name, report_id, output_file_path):
+        self.downloads.append((workspace_name, report_id))
+        if self.failing_downloads and self.downloads.count((workspace_name, report_id)) == 1:
+            raise OSError("Connection reset")
+        super().download_report(workspace_name, report_id, output_file_path)
+
+    def upload_report(self, workspace_name, report_name, pbix_file_path):
+        self.uploads.append((workspace_name, report_name))
+        super().upload_report(workspace_name, report_name, pbix_file_path)
+
+
+class PipelineTest(unittest.TestCase):
+    WORKSPACE = "Sales"
+    REPORTS = ["Report 0", "Report 1"]
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.service_dir_path = os.path.join(self.temp_dir.name, "service")
+        for report_index, report_name in enumerate(self.REPORTS):
+            benchmark.create_pbix(os.path.join(self.service_dir_path, self.WORKSPACE, report_name + ".pbix"),
+                                  datamodel_size=1 << 16, visuals_count=20, bookmarks_count=5, seed=report_index)
+        self.cli_args = argparse.Namespace(downloads=2, uploads=2, retries=3, retryDelay=0)
+        self.updater_cli_args = bookmarks_update.get_cli_parser().parse_args(["-y", "2024", "-m", "1", "-s"])
+        self.compiled_patterns = bookmarks_update.compile_period_patterns(
+            bookmarks_update.get_patterns_and_replacements(2024, 1, None))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def run_pipeline(self, transport, run_name):
+        # The same preparation of the working directory as in export_import.main, every run has its own folder
+        output_dir_path = os.path.join(self.temp_dir.name, run_name)
+        os.makedirs(os.path.join(output_dir_path, self.WORKSPACE))
+        bookmarks_update.setup_work_dir_paths(output_dir_path)
+        bookmarks_update.setup_backup_generation(run_name)
+        bookmarks_update.create_directories_hierarchy([self.WORKSPACE])
+        workspaces_and_reports = export_import.get_workspaces_and_reports(transport, [self.WORKSPACE], [])
+        return export_import.run_pipeline(transport, workspaces_and_reports, self.cli_args, self.updater_cli_args,
+                                          self.compiled_patterns)
+
+    def read_service_reports(self):
+        reports = {}
+        for report_name in self.REPORTS:
+            with open(os.path.join(self.service_dir_path, self.WORKSPACE, report_name + ".pbix"), "rb") as pbix_file:
+                reports[report_name] = pbix_file.read()
+        return reports
+
+    def test_failed_downloads_are_retried(self):
+        original_reports = self.read_service_reports()
+        transport = RecordingLocalFolderTransport(self.service_dir_path, failing_downloads=True)
+        pipeline_results = self.run_pipeline(transport, "run 1")
+
+        self.assertEqual([result["status"] for result in pipeline_results], ["OK", "OK"])
+        self.assertTrue(all(result["uploaded"] for result in pipeline_results))
+        self.assertEqual(sorted(transport.downloads), sorted((self.WORKSPACE, report) for report in self.REPORTS * 2))
+        self.assertEqual(sorted(transport.uploads), [(self.WORKSPACE, report) for report in self.REPORTS])
+        updated_reports = self.read_service_reports()
+        for report_name in self.REPORTS:
+            self.assertNotEqual(updated_reports[report_name], original_reports[report_name])
+
+    def test_skipped_reports_are_not_uploaded(self):
+        self.run_pipeline(RecordingLocalFolderTransport(self.service_dir_path), "run 1")
+        updated_reports = self.read_service_reports()
+
+        # the reports in the service are already updated to the period, so there is nothing to upload
+        transport = RecordingLocalFolderTransport(self.service_dir_path)
+        pipeline_results = self.run_pipeline(transport, "run 2")
+        self.assertEqual([result["status"] for result in pipeline_results], ["SKIPPED", "SKIPPED"])
+        self.assertFalse(any(result["uploaded"] for result in pipeline_results))
+        self.assertEqual(transport.uploads, [])
+        self.assertEqual(self.read_service_reports(), updated_reports)
+
+
+if __name__ == "__main__":
+    unittest.main()